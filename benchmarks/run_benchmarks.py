@@ -0,0 +1,258 @@
+"""Times the expensive parts of the library on the canonical systems of the examples
+(Lorenz, Aizawa, Thomas and a pendulum) and prints the results as JSON, so that
+they can be compared across versions.
+
+No video is rendered. Benchmarks of the NumPy engine run without manimlib, while the
+ones that build mobjects need manimlib (and an OpenGL context for the Scene), and are
+reported as skipped otherwise.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--repeat N] [--filter TEXT] [--output FILE]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dynamical_systems'))
+
+from dynamical_systems import *
+
+
+
+"""Systems (as defined in examples/strange_attractors_video/scenes.py)"""
+
+sigma, rho, beta = 10, 28, 8/3
+LORENZ = [
+    lambda x,y,z: sigma * (y - x),
+    lambda x,y,z: rho * x - y - x * z,
+    lambda x,y,z: x * y - beta * z,
+]
+
+a, b, c, d, e, f = 0.95, 0.7, 0.6, 3.5, 0.25, 0.1
+AIZAWA = [
+    lambda x,y,z: (z - b) * x - d * y,
+    lambda x,y,z: d * x + (z - b) * y,
+    lambda x,y,z: c + a * z - z**3 / 3 - (x**2 + y**2) * (1 + e * z) + f * z * x**3,
+]
+
+thomas_beta, thomas_scale = 0.19, 1.5
+THOMAS = [
+    lambda x,y,z: -thomas_beta * x + math.sin(y*thomas_scale) / thomas_scale,
+    lambda x,y,z: -thomas_beta * y + math.sin(z*thomas_scale) / thomas_scale,
+    lambda x,y,z: -thomas_beta * z + math.sin(x*thomas_scale) / thomas_scale,
+]
+
+friction, forcing = 0.5, 0.5
+PENDULUM = [
+    lambda x,y: y,
+    lambda x,y: - friction * y - math.sin(x) + forcing,
+]
+
+SYSTEMS = {
+    'lorenz': (LORENZ, [1, 1, 1]),
+    'aizawa': (AIZAWA, [0.1, 0, 0]),
+    'thomas': (THOMAS, [1, 0.5, 0]),
+    'pendulum': (PENDULUM, [1, 0]),
+}
+
+
+"""Benchmarks
+
+Each one is a function taking the size of the run (1 for quick runs) and returning a
+function to time, after doing whatever setup shouldn't be timed."""
+
+BENCHMARKS = []
+
+
+def benchmark(group, name, needs_scene=False):
+    def register(setup):
+        BENCHMARKS.append(dict(group=group, name=name, setup=setup, needs_scene=needs_scene))
+        return setup
+    return register
+
+
+for system_name, (functions, init_pos) in SYSTEMS.items():
+    for solver in ['euler', 'rk4', 'rk45']:
+        @benchmark('engine', f'integrate_trajectory[{system_name},{solver}]')
+        def setup(size, functions=functions, init_pos=init_pos, solver=solver):
+            return lambda: integrate_trajectory(functions, init_pos, 2000 * size, HD_TIME_DELTA, solver=solver)
+
+    @benchmark('engine', f'integrate_trajectories[{system_name},64 systems]')
+    def setup(size, functions=functions, init_pos=init_pos):
+        positions = np.array(init_pos) + np.random.default_rng(0).normal(scale=0.5, size=(64, len(init_pos)))
+        return lambda: integrate_trajectories(functions, positions, 500 * size, HD_TIME_DELTA)
+
+
+@benchmark('engine', 'fade_out_buffer[10000 segments]')
+def setup(size):
+    lengths = np.random.default_rng(0).uniform(0.005, 0.02, 10000 * size)
+    def run():
+        buffer = TraceFadeOutBuffer(1.5, 100, 0.05)
+        for length in lengths:
+            buffer.add_segment(length)
+            buffer.get_fade_out_factors()
+    return run
+
+
+@benchmark('engine', 'decimation[lorenz]')
+def setup(size):
+    points = integrate_trajectory(LORENZ, [1, 1, 1], 20000 * size, 0.005, solver='rk4').points / 10
+    return lambda: get_decimated_indices(points, 0.0025)
+
+
+@benchmark('mobjects', 'update_coords[lorenz]', needs_scene=True)
+def setup(size, scene=None):
+    system = DynamicalSystem(scene, [1, 1, 1], *LORENZ)
+    def run():
+        coords = system.coords.copy()
+        for _ in range(2000 * size):
+            system.update_coords(coords, HD_TIME_DELTA)
+    return run
+
+
+for system_name, (functions, init_pos) in SYSTEMS.items():
+    @benchmark('mobjects', f'snapshot[{system_name}]', needs_scene=True)
+    def setup(size, scene=None, functions=functions, init_pos=init_pos):
+        return lambda: DynamicalSystemSnapshot(scene, init_pos, [-5 * size, 5 * size], *functions)
+
+    @benchmark('mobjects', f'snapshot_color_coded[{system_name}]', needs_scene=True)
+    def setup(size, scene=None, functions=functions, init_pos=init_pos):
+        return lambda: DynamicalSystemSnapshot(scene, init_pos, [-5 * size, 5 * size], *functions, color_code_velocity='from_plane')
+
+
+@benchmark('mobjects', 'color_coding_setup[lorenz,from_plane]', needs_scene=True)
+def setup(size, scene=None):
+    return lambda: [DynamicalSystem(scene, [1, 1, 1], *LORENZ, color_code_velocity='from_plane') for _ in range(size)]
+
+
+@benchmark('mobjects', 'family_of_snapshots[pendulum,100 systems]', needs_scene=True)
+def setup(size, scene=None):
+    positions = [[x, y] for x in np.linspace(-3, 3, 10) for y in np.linspace(-3, 3, 10)]
+    return lambda: DynamicalSystemFamily(scene, positions, *PENDULUM, time_domain=[-2 * size, 2 * size], show_snapshots=True)
+
+
+for system_name in ['lorenz', 'aizawa', 'thomas']:
+    @benchmark('mobjects', f'fade_out_frames[{system_name}]', needs_scene=True)
+    def setup(size, scene=None, system_name=system_name):
+        functions, init_pos = SYSTEMS[system_name]
+        system = DynamicalSystem(scene, init_pos, *functions, fade_out_trace=True, max_number_of_trace_lines=100)
+        return lambda: update_frames(system.point, system.trace, n_of_frames=300 * size)
+
+
+@benchmark('mobjects', 'phase_plane_frames[pendulum]', needs_scene=True)
+def setup(size, scene=None):
+    plane = NumberPlane(x_range=[-4, 4], y_range=[-3, 3])
+    phase_plane = PhasePlane(scene, plane, *PENDULUM, color_code_velocity=True)
+    mobjects = [m for system in phase_plane.systems for m in (system.point, system.trace)]
+    return lambda: update_frames(*mobjects, n_of_frames=60 * size)
+
+
+@benchmark('mobjects', 'bifurcation_frames[pendulum]', needs_scene=True)
+def setup(size, scene=None):
+    plane = NumberPlane(x_range=[-2, 2], y_range=[-2, 2])
+    parameter = DecimalNumber(0)
+    bifurcation = Bifurcation(scene, plane, *PENDULUM, parameter, time_domain=[0, 2])
+    return lambda: update_frames(parameter, bifurcation.phase_plane, n_of_frames=5 * size)
+
+
+def update_frames(*mobjects, n_of_frames, dt=1/60):
+    """Runs the updaters of the mobjects as a scene would on each frame."""
+
+    for _ in range(n_of_frames):
+        for mobject in mobjects:
+            mobject.update(dt)
+
+
+
+"""Running"""
+
+def time_benchmark(setup, size, repeat, **kwargs):
+    run = setup(size, **kwargs)
+    run() # Warm up (e.g. fields that turn out not to be vectorized)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return dict(best=min(times), median=float(np.median(times)), times=times)
+
+
+def get_scene():
+    """Returns a Scene for the benchmarks that build mobjects, or None if it can't be created."""
+
+    if DS_HEADLESS:
+        return None
+    try:
+        return Scene()
+    except Exception:
+        traceback.print_exc(file=sys.stderr)
+        return None
+
+
+def get_version():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help="Smaller runs, to check that everything works")
+    parser.add_argument('--repeat', type=int, default=5, help="Times to run each benchmark")
+    parser.add_argument('--filter', default='', help="Only run benchmarks whose name contains this")
+    parser.add_argument('--output', help="File to write the results to (they're printed otherwise)")
+    args = parser.parse_args()
+
+    size = 1 if args.quick else 4
+    repeat = 1 if args.quick else args.repeat
+    benchmarks = [b for b in BENCHMARKS if args.filter in b['name']]
+    scene = get_scene() if any(b['needs_scene'] for b in benchmarks) else None
+
+    results = []
+    for b in benchmarks:
+        result = dict(group=b['group'], name=b['name'])
+        if b['needs_scene'] and scene is None:
+            result['skipped'] = "needs manimlib and an OpenGL context"
+        else:
+            print(f"Running {b['name']}", file=sys.stderr)
+            kwargs = dict(scene=scene) if b['needs_scene'] else dict()
+            try:
+                result.update(time_benchmark(b['setup'], size, repeat, **kwargs))
+            except Exception as exception:
+                result['error'] = repr(exception)
+                traceback.print_exc(file=sys.stderr)
+        results.append(result)
+
+    report = dict(
+        version=get_version(),
+        timestamp=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        python=platform.python_version(),
+        numpy=np.__version__,
+        machine=platform.machine(),
+        size=size,
+        repeat=repeat,
+        results=results,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
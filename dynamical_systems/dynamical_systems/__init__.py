@@ -1,5 +1,24 @@
-from dynamical_systems.base_dynamical_system import *
-from dynamical_systems.dynamical_system import *
-from dynamical_systems.expanded_scene import *
 from dynamical_systems.constants import *
-from dynamical_systems.pendulum import *
\ No newline at end of file
+from dynamical_systems.profiling import *
+from dynamical_systems.progress import *
+from dynamical_systems.vector_fields import *
+from dynamical_systems.solvers import *
+from dynamical_systems.ensemble import *
+from dynamical_systems.parallel import *
+from dynamical_systems.symbolic import *
+from dynamical_systems.trajectory_cache import *
+from dynamical_systems.fade_out import *
+from dynamical_systems.history import *
+from dynamical_systems.decimation import *
+from dynamical_systems.engine import *
+from dynamical_systems.lyapunov import *
+from dynamical_systems.poincare import *
+from dynamical_systems.basins import *
+from dynamical_systems.bifurcation import *
+
+# Mobjects and scenes, which render what the modules above compute
+if not DS_HEADLESS:
+    from dynamical_systems.base_dynamical_system import *
+    from dynamical_systems.dynamical_system import *
+    from dynamical_systems.expanded_scene import *
+    from dynamical_systems.pendulum import *
@@ -4,6 +4,11 @@ import copy
 from manimlib import *
 from dynamical_systems.constants import *
 from dynamical_systems.styles import *
+from dynamical_systems.solvers import *
+from dynamical_systems.vector_fields import *
+from dynamical_systems.engine import integrate_bilateral_trajectories
+from dynamical_systems.fade_out import *
+from dynamical_systems.profiling import *
 
 from enum import IntEnum
 from colour import Color
@@ -19,7 +24,6 @@ class Coords(IntEnum):
 # TODO: Make style parameters to be only accessed through the 'style' attribute of the system, not as regular attributes
 
 # TODO: implement using coords_to_point when showing phase planes
-# TODO: stop using python lists and np.arrays at the same time
 # TODO: Remove DynamicalSystemStyle class in favor of dicts
 # TODO: update color coding comments to include manual color coding
 # TODO: See if high mesh point resolution affects render time severely
@@ -43,6 +47,141 @@ class Trace(VGroup):
         ).move_to(initial_position)
 
 
+class ColoredTrace(VMobject):
+    """Trace drawn as a single VMobject whose stroke color, opacity and width can vary
+    along it, with one value per corner. Used for color-coded and fading traces, so
+    they cost one mobject no matter how long they are.
+
+    Corners are kept in growable buffers; call refresh_trace after adding or
+    modifying them to update the points and stroke data of the mobject. Traces whose
+    corners were only added to since the last refresh can append just the new ones."""
+
+    def __init__(self, initial_position, rgba, width, **kwargs):
+        self.initial_position = initial_position
+        self._corners = np.zeros((DS_TRACE_INITIAL_CAPACITY, 3))
+        self._rgbas = np.zeros((DS_TRACE_INITIAL_CAPACITY, 4))
+        self._widths = np.zeros(DS_TRACE_INITIAL_CAPACITY)
+        # Corners in use are the ones in [_start, _end)
+        self._start = 0
+        self._end = 0
+        # Number of corners in use (from the first one) that the points were built from
+        self._n_of_refreshed_corners = 0
+        super().__init__(**kwargs)
+        self.add_corners([initial_position], [rgba], [width])
+        self.refresh_trace()
+
+    def init_points(self):
+        self.set_points_as_corners([self.initial_position] * 2)
+
+    @classmethod
+    def for_dynamical_system(cls, initial_position, color, width, opacity):
+        return cls(
+            initial_position=initial_position,
+            rgba=color_to_rgba(color, opacity),
+            width=width,
+        )
+
+    def get_num_corners(self):
+        return self._end - self._start
+
+    @property
+    def corners(self):
+        return self._corners[self._start:self._end]
+
+    @property
+    def corner_rgbas(self):
+        """Stroke color and opacity of each corner (can be modified in place)."""
+        return self._rgbas[self._start:self._end]
+
+    @property
+    def corner_widths(self):
+        """Stroke width of each corner (can be modified in place)."""
+        return self._widths[self._start:self._end]
+
+    def get_segment_lengths(self):
+        return np.linalg.norm(np.diff(self.corners, axis=0), axis=1)
+
+    def add_corners(self, points, rgbas, widths):
+        n_of_new_corners = len(points)
+        self._reserve(n_of_new_corners)
+        new_corners = slice(self._end, self._end + n_of_new_corners)
+        self._corners[new_corners] = points
+        self._rgbas[new_corners] = rgbas
+        self._widths[new_corners] = widths
+        self._end += n_of_new_corners
+
+    def remove_first_corners(self, n_of_corners):
+        if n_of_corners > 0:
+            self._start = min(self._start + n_of_corners, self._end - 1)
+            self._n_of_refreshed_corners = 0
+
+    def remove_corners_after_first(self):
+        self._end = self._start + 1
+        self._n_of_refreshed_corners = 0
+
+    def refresh_trace(self, only_new_corners=False):
+        """Updates the points and stroke data of the mobject. With only_new_corners, the
+        ones of corners added since the last refresh are appended, unless corners were
+        removed in between. Otherwise (e.g. after modifying corner_rgbas or corner_widths)
+        they're all rebuilt."""
+
+        n_of_new_corners = self.get_num_corners() - self._n_of_refreshed_corners
+        if only_new_corners and self._n_of_refreshed_corners > 1:
+            if n_of_new_corners > 0:
+                self._append_corners(n_of_new_corners)
+        else:
+            corners = self.corners
+            if len(corners) == 1:
+                corners = np.repeat(corners, 2, axis=0)
+            self.set_points_as_corners(corners)
+
+            n_of_points = len(self.get_points())
+            self.set_rgba_array(resize_with_interpolation(self.corner_rgbas, n_of_points), name="stroke_rgba")
+            self.set_stroke(width=resize_with_interpolation(self.corner_widths, n_of_points))
+
+        self._n_of_refreshed_corners = self.get_num_corners()
+        return self
+
+    def _append_corners(self, n_of_new_corners):
+        """Appends the points and stroke data of the last n_of_new_corners corners,
+        laid out as set_points_as_corners does: a handle halfway along each new
+        segment, then its end corner."""
+
+        corners = self.corners[-n_of_new_corners - 1:]
+        points = np.empty((2 * n_of_new_corners, 3))
+        points[0::2] = 0.5 * (corners[:-1] + corners[1:])
+        points[1::2] = corners[1:]
+
+        n_of_points = len(self.get_points())
+        self.append_points(points)
+        # Handles take the average of the stroke data of the corners around them
+        for name, values in [("stroke_rgba", self.corner_rgbas), ("stroke_width", self.corner_widths[:, np.newaxis])]:
+            values = values[-n_of_new_corners - 1:]
+            new_data = self.data[name][n_of_points:]
+            new_data[0::2] = 0.5 * (values[:-1] + values[1:])
+            new_data[1::2] = values[1:]
+
+    def _reserve(self, n_of_new_corners):
+        """Makes room for new corners at the end of the buffers, moving the corners
+        in use to the start of the buffers and growing them if needed."""
+
+        capacity = len(self._corners)
+        if self._end + n_of_new_corners <= capacity:
+            return
+
+        n_of_corners = self.get_num_corners()
+        new_capacity = capacity
+        while n_of_corners + n_of_new_corners > new_capacity // 2:
+            new_capacity *= 2
+
+        for name in ['_corners', '_rgbas', '_widths']:
+            buffer = getattr(self, name)
+            new_buffer = np.zeros((new_capacity, *buffer.shape[1:]))
+            new_buffer[:n_of_corners] = buffer[self._start:self._end]
+            setattr(self, name, new_buffer)
+        self._start, self._end = 0, n_of_corners
+
+
 
 class BaseDynamicalSystem(VGroup):
     """Base class for dynamical systems."""
@@ -51,46 +190,49 @@ class BaseDynamicalSystem(VGroup):
         self, 
         scene, 
         init_pos, 
-        dx, 
-        dy, 
+        dx=None, 
+        dy=None, 
         dz=None, 
         show_point=True, 
         color_code_velocity=False, 
         fade_out_trace=False, 
         style: DynamicalSystemStyle = BASE_STYLE, 
+        vector_field: SystemVectorField = None, # Can be given instead of dx, dy and dz (see compile_vector_field)
+        color_coding_limit=None, # Precomputed limit for automatic color coding (e.g. shared by a family)
         **kwargs
     ):
         self.__dict__.update(style.as_dict()) # Bundle style parameters into a 'style' attribute
         self.__dict__.update(kwargs)
         self.show_point = show_point
         self.scene = scene
-        self.dimension_axes = [Coords.X, Coords.Y]
-        self.functions = [dx, dy]
 
-        if dz is not None:
-            self.dimension_axes.append(Coords.Z)
-            self.functions.append(dz)
+        if vector_field is None:
+            assert dx is not None and dy is not None, "Should pass either dx and dy (and maybe dz) or a vector_field"
+            vector_field = SystemVectorField([dx, dy, dz])
+        self.vector_field = vector_field
+        self.functions = list(vector_field.functions)
+        self.dimension_axes = [Coords.X, Coords.Y, Coords.Z][:vector_field.dimension]
         
         self.dimension = len(self.dimension_axes)
+        self._solver = get_solver(self.solver)
 
         assert len(init_pos) == self.dimension, f"Initial position should have {self.dimension} coordinates"
         assert isinstance(scene, Scene), "A Scene object should be passed as the 'scene' parameter"
 
-        self.init_pos_vector = self.get_np_array_from_list(self.adapt_dimensions(init_pos))
+        self.init_pos_vector = self.get_np_array_from_list(init_pos)
 
-        self.coords = copy.deepcopy(list(init_pos)) # Will store the current position of the system
-        self.last_coords = copy.deepcopy(list(init_pos)) # Will store the last position of the system
+        # Positions of the system, as 3D points (z=0 for 2D systems) that are updated in place
+        self.coords = self.init_pos_vector.copy() # Current position
+        self.last_coords = self.init_pos_vector.copy() # Position before the last step
 
         self.is_updated_coord_too_far = False
-        self.second_to_last_coords = [copy.deepcopy(list(init_pos)) for _ in range(self.precision_multiplier_if_trace_too_rough - 1)]
+        # Positions before each of the substeps of the last step, if it was split (see DynamicalSystem.get_point)
+        self.second_to_last_coords = np.tile(self.init_pos_vector, (self.precision_multiplier_if_trace_too_rough - 1, 1))
 
         self.color_code_velocity = color_code_velocity
+        self.color_coding_limit = color_coding_limit
         self.fade_out_trace = fade_out_trace
-        if fade_out_trace:
-            self.sum_of_trace_line_lengths = 0
-            self.first_index_not_to_fade_out = None
-            self.sum_of_all_trace_lines = 0
-            self.sum_of_trace_lines_not_faded_out = 0
+        self._coords_derivative = None # (coords, field at coords), see get_derivative_at_coords
 
         # Parameters to handle in system color manager:
             # color_code_velocity
@@ -123,143 +265,122 @@ class BaseDynamicalSystem(VGroup):
         self.scene.remove(self.point, self.trace)
 
     def get_base_trace(self):
-        return Trace.for_dynamical_system(
+        trace_class = ColoredTrace if self.color_code_velocity or self.fade_out_trace else Trace
+        trace = trace_class.for_dynamical_system(
             self.init_pos_vector,
             self.color,
             self.width,
             self.stroke_opacity
         )
-
-    def get_trace_update_function(self): # add_line_objects_to_trace
         if self.fade_out_trace:
-            return lambda t, c, lc: self.add_line_objects_to_trace_and_fade_out(t, c, lc)
-        elif self.color_code_velocity:
-            return lambda t, c, lc: self.add_line_objects_to_trace(t, c, lc)
-        else:
-            return lambda t, c, lc: self.add_corners_to_trace(t, c)
-
-    def get_new_line_position(self, coords, last_coords):
-        last_coords_vector = self.get_np_array_from_list(last_coords)
-        coords_vector = self.get_np_array_from_list(coords)
-        buff_to_avoid_overlap = self.line_trace_overlap_buff * (coords_vector - last_coords_vector)
-        return last_coords_vector + buff_to_avoid_overlap, coords_vector - buff_to_avoid_overlap
-
-    def add_line_objects_to_trace(self, trace, coords, last_coords):
-        # Assuming trace is a VGroup object
-        new_position = self.get_new_line_position(coords, last_coords)
-        new_line = Line(
-            new_position[0],
-            new_position[1],
-            color=self.get_trace_color(),
-            stroke_width=self.width,
-            stroke_opacity=self.stroke_opacity
+            # Each trace fades out on its own (e.g. both pieces of a snapshot)
+            trace.fade_out_buffer = self.get_trace_fade_out_buffer()
+        return trace
+
+    def get_trace_fade_out_buffer(self):
+        return TraceFadeOutBuffer(
+            self.amount_to_not_fade_out_trace_before,
+            self.max_number_of_trace_lines,
+            self.trace_fadeout_decrease_factor,
+            segments_per_step=self.precision_multiplier_if_trace_too_rough
         )
-        trace.submobjects.append(new_line)
-        trace.family.insert(0, new_line)
-        trace.refresh_bounding_box()
-
-    def add_line_objects_to_trace_and_fade_out(self, trace: VGroup, coords, last_coords):
-        new_position = self.get_new_line_position(coords, last_coords)
-        new_line = Line(
-            new_position[0],
-            new_position[1],
-            color=self.get_trace_color(),
-            stroke_width=self.width,
-            stroke_opacity=self.stroke_opacity
-        )
-
-        trace.add(new_line)
 
-        self.sum_of_trace_lines_not_faded_out += np.linalg.norm(new_line.get_vector(), 2)
-        self.sum_of_all_trace_lines += np.linalg.norm(new_line.get_vector(), 2)
+    def get_trace_update_function(self):
+        if self.color_code_velocity or self.fade_out_trace:
+            return lambda t, c, lc: self.add_colored_corner_to_trace(t, c)
+        else:
+            return lambda t, c, lc: self.add_corners_to_trace(t, c)
 
-        trace_length = len(trace.submobjects)
+    def add_colored_corner_to_trace(self, trace: ColoredTrace, coords):
+        # Corners are colored by the velocity at the system's current position
+        derivative = self.get_derivative_at_coords(self.coords)
+        self.add_colored_corners_to_trace(trace, coords.reshape(1, 3), self.get_trace_rgbas([derivative]))
 
-        non_faded_out_trace_length = trace_length if self.first_index_not_to_fade_out is None else len(trace.submobjects[self.first_index_not_to_fade_out:])
-        should_fade_out_something = self.sum_of_all_trace_lines >= self.amount_to_not_fade_out_trace_before or non_faded_out_trace_length > self.max_number_of_trace_lines
+    def add_colored_corners_to_trace(self, trace: ColoredTrace, points, rgbas):
+        """Adds corners with the given colors to a color-coded or fading trace,
+        and removes the segments that end up completely faded out."""
 
-        if self.first_index_not_to_fade_out is None:
-            if non_faded_out_trace_length > self.max_number_of_trace_lines:
-                self.first_index_not_to_fade_out = 1
+        trace.add_corners(points, rgbas, np.full(len(points), self.width))
 
-            partial_sum_of_trace_line_lengths = 0
-            for i in range(1, trace_length + 1):
-                partial_sum_of_trace_line_lengths += np.linalg.norm(trace.submobjects[-i].get_vector(), 2)
-                if partial_sum_of_trace_line_lengths > self.amount_to_not_fade_out_trace_before:
-                    self.first_index_not_to_fade_out = trace_length - i
-                    self.sum_of_trace_lines_not_faded_out = partial_sum_of_trace_line_lengths
-                    break
-        else:
-            if self.sum_of_trace_lines_not_faded_out >= self.amount_to_not_fade_out_trace_before or non_faded_out_trace_length > self.max_number_of_trace_lines:
-                if self.sum_of_trace_lines_not_faded_out < self.amount_to_not_fade_out_trace_before:
-                    self.first_index_not_to_fade_out += 1
-                else:
-                    a = self.sum_of_trace_lines_not_faded_out
-                    found_value = False
-                    for i in range(1, trace_length - self.first_index_not_to_fade_out + 1):
-                        if a - sum(np.linalg.norm(trace.submobjects[j].get_vector(),2)
-                            for j in range(self.first_index_not_to_fade_out, self.first_index_not_to_fade_out + i)
-                        ) <= self.amount_to_not_fade_out_trace_before:
-                            found_value = True
-                            self.first_index_not_to_fade_out += i
-                            break
-                    if not found_value:
-                        if non_faded_out_trace_length > self.max_number_of_trace_lines:
-                            self.first_index_not_to_fade_out += 1
-                        else:
-                            self.first_index_not_to_fade_out = trace_length - 1
-            else:
-                pass
-            self.sum_of_trace_lines_not_faded_out = sum(np.linalg.norm(line.get_vector(), 2) for line in trace.submobjects[self.first_index_not_to_fade_out:])
-            self.sum_of_all_trace_lines = sum(np.linalg.norm(line.get_vector(), 2) for line in trace.submobjects)
-
-        if self.first_index_not_to_fade_out is not None and should_fade_out_something:
-            for index in range(self.first_index_not_to_fade_out-1, -1, -1):
-                opacity = trace.submobjects[index].get_opacity()
-                if opacity <= 2 * self.trace_fadeout_decrease_factor:
-                    trace.submobjects[index].set_opacity(0)
-                    self.trace.submobjects = self.trace.submobjects[index+1:]
-                    self.first_index_not_to_fade_out -= index+1
-                    break
-                else:
-                    trace.submobjects[index].set_opacity(
-                        max(0, opacity - self.trace_fadeout_decrease_factor)
-                    )
-                    trace.submobjects[index].set_stroke(
-                        width=trace.submobjects[index].get_stroke_width() * (1 - self.trace_fadeout_decrease_factor)
-                    )
+        if self.fade_out_trace:
+            with profile_stage('fade_out', self, n_of_items=len(points)):
+                new_segment_lengths = np.linalg.norm(np.diff(trace.corners[-len(points) - 1:], axis=0), axis=1)
+                trace.remove_first_corners(sum(
+                    trace.fade_out_buffer.add_segment(length) for length in new_segment_lengths
+                ))
+
+    def fade_out(self, trace: ColoredTrace):
+        """Sets the opacity and width of each segment of a fading trace according
+        to how long it has been fading out (see TraceFadeOutBuffer)."""
+
+        # Segment i goes from corner i to corner i+1, and takes its opacity and width
+        # from corner i+1
+        with profile_stage('fade_out', self):
+            opacity_factors, width_factors = trace.fade_out_buffer.get_fade_out_factors()
+            trace.corner_rgbas[1:, 3] = self.stroke_opacity * opacity_factors
+            trace.corner_widths[1:] = self.width * width_factors
+            trace.corner_rgbas[0, 3] = trace.corner_rgbas[min(1, trace.get_num_corners() - 1), 3]
+            trace.corner_widths[0] = trace.corner_widths[min(1, trace.get_num_corners() - 1)]
 
     def add_corners_to_trace(self, trace, coords):
-        trace.add_points_as_corners([self.get_np_array_from_list(coords)])
+        trace.add_points_as_corners([coords])
 
     def update_trace(self, trace, coords, last_coords):
         (self.trace_update_function)(trace, coords, last_coords)
 
+    def refresh_trace(self, trace):
+        """Updates the mobject of the trace after adding corners to it."""
+
+        if isinstance(trace, ColoredTrace):
+            if self.fade_out_trace:
+                self.fade_out(trace)
+            # Fading changes the stroke data of every corner, so it's rebuilt
+            trace.refresh_trace(only_new_corners=not self.fade_out_trace)
+
+
+    def get_trace_rgbas(self, derivatives):
+        """Returns the RGBA color of the trace at positions where the system
+        has the given derivatives, in an array of shape (n_of_positions, 4)."""
 
-    def get_trace_color(self):
         if self.color_code_velocity:
-            vec = self.get_np_array_from_list(self.apply_functions_to_point(self.coords))
-            val = np.linalg.norm(vec, 2)
-            for color, limit in self.color_mappings:
-                if val > limit:
-                    return color
-        elif self.fade_out_trace:
-            return self.color
+            with profile_stage('color_lookup', self, n_of_items=len(derivatives)):
+                speeds = np.linalg.norm(np.asarray(derivatives, dtype=float).reshape(len(derivatives), -1), axis=1)
+                # Index of the largest threshold below each speed (or the slowest color)
+                indices = np.searchsorted(self.color_thresholds, speeds, side='left') - 1
+                return self.color_rgbas[np.maximum(indices, 0)]
+        return np.tile(color_to_rgba(self.color, self.stroke_opacity), (len(derivatives), 1))
+
+    def get_derivative_at_coords(self, coords):
+        """Returns the field at coords, reusing the last value if it was
+        for the same coordinates (e.g. when color coding and then stepping)."""
+
+        key = tuple(coords[:self.dimension].tolist())
+        if self._coords_derivative is None or self._coords_derivative[0] != key:
+            self._coords_derivative = (key, self.vector_field.evaluate_at_point(key))
+        return self._coords_derivative[1]
 
     def copy_coords(self, vec1, vec2):
-        """Copies values of vec2 into vec1."""
-
-        for i in range(len(vec2)):
-            vec1[i] = vec2[i]
+        """Copies values of vec2 into vec1 (in place)."""
 
+        vec1[:len(vec2)] = vec2
         return vec1
 
 
     def get_np_array_from_list(self, point):
-        """Takes a point in the form of a list with two or three elements
-        and returns a np.array with the point in question."""
+        """Takes a point in the form of a list (or np.array) with two or three
+        elements and returns a new 3D np.array with the point in question."""
+
+        return np.array(self.adapt_dimensions(point), dtype=float)
+
 
-        return np.array(np.array(self.adapt_dimensions(point)))
+    def get_points_in_3d(self, points):
+        """Takes an array of positions of the system, of shape (n_of_points, dimension),
+        and returns them as 3D points (with z=0 for 2D systems)."""
+
+        points = np.asarray(points, dtype=float)
+        if points.shape[1] == 3:
+            return points
+        return np.hstack([points, np.zeros((len(points), 3 - points.shape[1]))])
 
 
     def get_list_from_np_array(self, point):
@@ -274,26 +395,35 @@ class BaseDynamicalSystem(VGroup):
         return [point[0], point[1], point[2] if self.dimension == 3 else 0]
 
 
-    def update_coord(self, coords, dt, axis):
-        return coords[axis] + self.functions[axis](*coords) * dt * self.speed_rate
-
-
     def update_coords(self, coords, dt):
-        for axis in self.dimension_axes:
-            coords[axis] = self.update_coord(coords, dt, axis)
+        """Advances the given coordinates (a np.array) by dt in place, with the system's solver."""
+
+        state = coords[:self.dimension].reshape(1, -1)
+        derivative = self.get_derivative_at_coords(coords).reshape(1, -1)
+        coords[:self.dimension] = self._solver.step(self.vector_field, state, dt * self.speed_rate, derivative)[0]
         return coords
 
 
+    def get_integration_settings(self, include_solver=True):
+        """Returns the style attributes that affect how the system is integrated."""
+
+        settings = dict(
+            speed_rate=self.speed_rate,
+            precision_multiplier_if_trace_too_rough=self.precision_multiplier_if_trace_too_rough,
+            trace_precision_increase_threshold=self.trace_precision_increase_threshold,
+        )
+        if include_solver:
+            settings['solver'] = self._solver
+        return settings
+
+
     def apply_functions_to_point(self, point):
         """Applies the system functions to a point (either a np.array or list)."""
+        derivative = self.vector_field.evaluate_at_point(point)
         if isinstance(point, np.ndarray):
-            return np.array([
-                self.functions[Coords.X](*self.get_list_from_np_array(point)),
-                self.functions[Coords.Y](*self.get_list_from_np_array(point)),
-                self.functions[Coords.Z](*self.get_list_from_np_array(point)) if self.dimension == 3 else 0
-            ])
+            return self.get_np_array_from_list(derivative)
         else:
-            return [self.functions[i](*point) for i in range(len(point))]
+            return list(derivative)
 
     
     def build_solution(self):
@@ -323,74 +453,116 @@ class BaseDynamicalSystem(VGroup):
 
 
     def _calculate_local_section_or_flow_box(self, point, is_flow_box):
-        # TODO: Make it so this stops relying so heavily on d_list. Maybe add class attributes for their cords instead.
-        pos = self.get_np_array_from_list(point)
-        
-        # Tangent, perpendicular and normalized perpendicular vectors to the position
-        tangent_vector = self.apply_functions_to_point(pos)
-        perp_vector = self.get_np_array_from_list([-tangent_vector[1],tangent_vector[0]])
-        norm_perp_vector = normalize(perp_vector) * 0.5
-
-        # Axis and center of the local section
-        section_color = self.flow_box_perp_vector_color if is_flow_box else self.local_section_perp_vector_color
-        line_start = pos - norm_perp_vector
-        line_end = pos + norm_perp_vector
-        section_perp_line = Line(
-            start=line_start, 
-            end=line_end,
-            color=section_color
-        )
-        line_start_tip = Dot(line_start, color=section_color, radius=0.035)
-        line_end_tip = Dot(line_end, color=section_color, radius=0.035)
-        section_perp_line = VGroup(section_perp_line, line_start_tip, line_end_tip)
-        section_center = Dot(pos, radius=self.point_radius, color=self.local_section_vector_color)
-
-        # Number of vectors to draw for each orientation (up, down), and the vectors (anchors) in question
-        vec_freq = self.local_section_vec_freq
-        anchors = [
-            pos + norm_perp_vector - i * norm_perp_vector
-            for i in np.arange(0, 2 + 1/vec_freq, 1/vec_freq)
-        ]
-        solutions = []
-        if is_flow_box:
-            # Coords of points of the left and right sides of the flow box, respectively
-            flow_box_side_points = [[], []]
-            # Actual sides to return
-            flow_box_sides = []
-
-            for vec in anchors:
-                direction = normalize(self.apply_functions_to_point(vec)) * 0.7
-                solution = self.get_solution_through_point(vec)
-                solutions.append(solution.trace)
-                flow_box_side_points[0].append(solution.extreme_point_backward)
-                flow_box_side_points[1].append(solution.extreme_point_forward)
-
-            for i in [0,1]:
-                flow_box_sides += [
-                    Circle(
-                        radius=0,
-                        stroke_color=self.flow_box_trace_color,
-                    ).move_to(flow_box_side_points[i][0])
-                ]
-                flow_box_sides[i].set_points_as_corners(flow_box_side_points[i])
-
-            # Group section center with box sides for convenience
-            section_center = VGroup(section_center, *flow_box_sides)
-        else:
-            for vec in anchors + [pos]:
-                direction = normalize(self.apply_functions_to_point(vec)) * 0.7
-                solutions.append(Line(
-                    start=vec,
-                    end=vec + direction,
-                    color=self.local_section_vector_color
-                ).add_tip(length=0.1, width=0.1))
-
-        local_section = VGroup(*solutions, section_perp_line, section_center)
-        return local_section
-    
-
-    def get_solution_through_point(self, point):
-        raise Exception("Need to implement get_solution_through_point in a subclass.")
+        return FlowBox(self, point) if is_flow_box else LocalSection(self, point)
+
+
+
+
+class LocalSection(VGroup):
+    """Local section of a 2D system through a position: a segment perpendicular to the field
+    there, centered on it, with the direction of the field at its anchors (see get_anchors)
+    and center. Its submobjects are moved in place (see move_section_to), so it can follow
+    a system on every frame."""
+
+    shows_field = True
+
+    def __init__(self, system: BaseDynamicalSystem, position, color=None):
+        self.system = system
+        color = color or system.local_section_perp_vector_color
+        n_of_vectors = 2 * system.local_section_vec_freq + 2 if self.shows_field else 0
+        # Each vector is a line and a tip, reshaped as the field changes instead of being rotated
+        self.vectors = VGroup(*[
+            VGroup(
+                Line(color=system.local_section_vector_color),
+                VMobject(fill_color=system.local_section_vector_color, fill_opacity=1, stroke_width=0)
+            ) for _ in range(n_of_vectors)
+        ])
+        self.perp_line = Line(color=color)
+        self.line_tips = VGroup(*[Dot(color=color, radius=0.035) for _ in range(2)])
+        self.center_dot = Dot(radius=system.point_radius, color=system.local_section_vector_color)
+        super().__init__(self.vectors, self.perp_line, self.line_tips, self.center_dot)
+        self.move_section_to(position)
+
+    def move_section_to(self, position):
+        self.section_position = self.system.get_np_array_from_list(position)
+        tangent_vector = self.system.vector_field.evaluate_at_point(self.section_position)
+        self.perp_vector = normalize(np.array([-tangent_vector[1], tangent_vector[0], 0])) * 0.5
+
+        line_start, line_end = self.section_position - self.perp_vector, self.section_position + self.perp_vector
+        self.perp_line.set_points_as_corners([line_start, line_end])
+        self.line_tips[0].move_to(line_start)
+        self.line_tips[1].move_to(line_end)
+        self.center_dot.move_to(self.section_position)
+        if self.shows_field:
+            self.update_vectors()
+        return self
+
+    def update_vectors(self):
+        """Points each vector in the direction of the field at its start, evaluating it at all of them at once."""
+
+        starts = np.vstack([self.get_anchors(), self.section_position])
+        directions = self.system.get_points_in_3d(self.system.vector_field(starts[:, :self.system.dimension]))
+        norms = np.linalg.norm(directions, axis=1, keepdims=True)
+        directions = np.divide(directions, norms, out=np.zeros_like(directions), where=norms > 0)
+
+        ends = starts + 0.7 * directions
+        tip_bases = ends - 0.1 * directions
+        # Half the width of the tips, perpendicular to each vector
+        tip_wings = 0.05 * np.column_stack([-directions[:, 1], directions[:, 0], np.zeros(len(directions))])
+        for (line, tip), start, end, tip_base, tip_wing in zip(self.vectors, starts, ends, tip_bases, tip_wings):
+            line.set_points_as_corners([start, tip_base])
+            tip.set_points_as_corners([end, tip_base + tip_wing, tip_base - tip_wing, end])
+
+    def get_anchors(self):
+        """Returns the points of the section the field is shown at (local_section_vec_freq of them
+        on each half of the section, plus the ends), from one end to the other."""
+
+        n_of_anchors = 2 * self.system.local_section_vec_freq + 1
+        return self.section_position + np.linspace(1, -1, n_of_anchors)[:, None] * self.perp_vector
+
+
+
+class FlowBox(LocalSection):
+    """Flow box of a 2D system around a position: the local section there, along with the
+    solutions through its anchors over the flow_box_solution_time_domain style attribute and the
+    sides they span. The solutions through every anchor are integrated together, backward and
+    forward in time at once, and written into the same traces whenever the box is moved."""
+
+    shows_field = False
+
+    def __init__(self, system: BaseDynamicalSystem, position):
+        n_of_anchors = 2 * system.local_section_vec_freq + 1
+        self.traces = VGroup(*[
+            VMobject(stroke_color=system.flow_box_trace_color, stroke_width=system.flow_box_trace_width)
+            for _ in range(n_of_anchors)
+        ])
+        self.sides = VGroup(*[VMobject(stroke_color=system.flow_box_trace_color) for _ in range(2)])
+        # Solvers can keep state between steps (see Solver.reset), so the box gets its own
+        # instead of changing how the system's next steps are taken
+        self._solver = copy.copy(system._solver)
+        super().__init__(system, position, system.flow_box_perp_vector_color)
+        self.add_to_back(self.traces)
+        self.add(self.sides)
+
+    def move_section_to(self, position):
+        super().move_section_to(position)
+        anchors = self.get_anchors()
+        with profile_stage('integration', self.system, n_of_items=len(anchors)):
+            self._solver.reset()
+            backward_points, forward_points = integrate_bilateral_trajectories(
+                self.system.vector_field,
+                anchors[:, :self.system.dimension],
+                self.system.flow_box_solution_time_domain,
+                self.system.time_delta or DEFAULT_TIME_DELTA,
+                self._solver
+            )
+
+        with profile_stage('trace_update', self.system, n_of_items=len(anchors)):
+            for trace, backward_piece, forward_piece in zip(self.traces, backward_points, forward_points):
+                trace.set_points_as_corners(self.system.get_points_in_3d(np.concatenate([backward_piece[::-1], forward_piece[1:]])))
+            self.sides[0].set_points_as_corners(self.system.get_points_in_3d(backward_points[:, -1]))
+            self.sides[1].set_points_as_corners(self.system.get_points_in_3d(forward_points[:, -1]))
+        return self
 
 
 
@@ -403,10 +575,16 @@ class SystemColorManager:
             slow_to_med_color_weight = 1
             # A few ways of automatically generating the color code limit, i.e. the value
             # after which lines are painted in the color associated ot the highest velocity.
-            if dynamical_system.color_code_velocity == 'from_trace':
+            if dynamical_system.color_code_velocity in ['from_trace', 'from_plane'] and dynamical_system.color_coding_limit is not None:
+                color_coding_limit = dynamical_system.color_coding_limit
+            elif dynamical_system.color_code_velocity == 'from_trace':
                 color_coding_limit = self._get_color_coding_limit_from_trace_simulation(dynamical_system) 
             elif dynamical_system.color_code_velocity == 'from_plane':
-                color_coding_limit = self._get_color_coding_limit_from_plane_points(dynamical_system) 
+                color_coding_limit = self.get_color_coding_limit_from_plane_points(
+                    dynamical_system.vector_field,
+                    dynamical_system.color_coding_grid_range,
+                    dynamical_system.color_coding_grid_resolution
+                )
             elif dynamical_system.color_code_velocity == 'manual':
                 color_coding_limit = dynamical_system.velocity_colors[2][1]
                 # slow_to_med_color_weight should be the percentage of the color coding limit
@@ -435,11 +613,18 @@ class SystemColorManager:
             dynamical_system.color_mappings = list(zip(colors, value_range))
             dynamical_system.color_mappings.reverse()
 
+            # Lookup table for coloring many positions at once (see get_trace_rgbas)
+            n_of_colors = min(len(colors), len(value_range))
+            dynamical_system.color_thresholds = np.array(value_range[:n_of_colors], dtype=float)
+            dynamical_system.color_rgbas = np.array([
+                color_to_rgba(color, dynamical_system.stroke_opacity) for color in colors[:n_of_colors]
+            ])
+
     def _get_color_coding_limit_from_trace_simulation(self, dynamical_system: BaseDynamicalSystem):
         """Generates a color coding limit by iteratively updating the system's
         coordinates and using the maximum of all calculated coordinates.."""
 
-        initial_coords = copy.deepcopy(dynamical_system.coords)
+        initial_coords = dynamical_system.coords.copy()
         color_coding_limit = max(
             np.linalg.norm(
                 dynamical_system.update_coords(initial_coords, HD_TIME_DELTA), 2
@@ -450,21 +635,22 @@ class SystemColorManager:
         # which we can't have currently
         return color_coding_limit if color_coding_limit > 0 else 0.01
 
-    def _get_color_coding_limit_from_plane_points(self, dynamical_system: BaseDynamicalSystem):
+    def get_color_coding_limit_from_plane_points(
+        self,
+        vector_field: SystemVectorField,
+        grid_range=None,
+        grid_resolution=None
+    ):
         """Generates a color coding limit by applying the system functions once
-        to a bunch of integer pairs of the plane and getting the maximum among
-        those values."""
-
-        rg_vals = [-DS_PLANE_COLOR_CODING_VALUES_RANGE, DS_PLANE_COLOR_CODING_VALUES_RANGE]
-        if dynamical_system.dimension == 3:
-            return max(
-                np.linalg.norm(
-                    dynamical_system.apply_functions_to_point([x, y, z]), 2
-                ) for x in range(*rg_vals) for y in range(*rg_vals) for z in range(*rg_vals)
-            ) * DS_COLOR_CODING_SCALE_FACTOR
-        else:
-            return max(
-                np.linalg.norm(
-                    dynamical_system.apply_functions_to_point([x, y]), 2
-                ) for x in range(*rg_vals) for y in range(*rg_vals)
-            ) * DS_COLOR_CODING_SCALE_FACTOR
\ No newline at end of file
+        to the points of a grid of the plane (or space) and getting the maximum
+        among those values. The whole grid is evaluated at once, so families can
+        compute this once and pass it to each of their systems."""
+
+        grid_range = grid_range or [-DS_PLANE_COLOR_CODING_VALUES_RANGE, DS_PLANE_COLOR_CODING_VALUES_RANGE]
+        grid_resolution = grid_resolution or DS_PLANE_COLOR_CODING_GRID_RESOLUTION
+
+        axis_values = np.linspace(*grid_range, grid_resolution, endpoint=False)
+        grid = np.stack(
+            np.meshgrid(*[axis_values] * vector_field.dimension, indexing='ij'), axis=-1
+        ).reshape(-1, vector_field.dimension)
+        return np.linalg.norm(vector_field(grid), axis=1).max() * DS_COLOR_CODING_SCALE_FACTOR
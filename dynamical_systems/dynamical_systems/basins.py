@@ -0,0 +1,142 @@
+import numpy as np
+import math
+
+from dynamical_systems.constants import *
+from dynamical_systems.solvers import get_solver
+from dynamical_systems.engine import get_vector_field
+from dynamical_systems.parallel import run_in_parallel
+from dynamical_systems.progress import ProgressReporter
+
+
+
+class FateMap:
+    """Fate of the trajectory through each point of a grid of initial positions.
+
+    labels[i, j] is the index of the attractor the trajectory through (x_values[j],
+    y_values[i]) settled on, DS_FATE_ESCAPED or DS_FATE_UNDECIDED, and n_of_steps[i, j]
+    is the number of steps it took to tell. Rows go from the top of the grid (largest y)
+    to its bottom, like the rows of an image."""
+
+    def __init__(self, labels, n_of_steps, x_values, y_values):
+        self.labels = labels
+        self.n_of_steps = n_of_steps
+        self.x_values = x_values
+        self.y_values = y_values
+
+    def get_fractions(self):
+        """Returns the fraction of the grid in the basin of each label."""
+
+        labels, counts = np.unique(self.labels, return_counts=True)
+        return dict(zip(labels.tolist(), (counts / self.labels.size).tolist()))
+
+
+def get_fate_map(
+    vector_field,
+    x_range,
+    y_range,
+    resolution, # Number of initial positions per axis, or (n_of_columns, n_of_rows)
+    attractors, # Points the trajectories settle on, or a function that labels states (see classify_states)
+    n_of_iterations,
+    time_delta=DEFAULT_TIME_DELTA,
+    tolerance=1e-2, # How close to an attractor point a trajectory has to get to settle on it
+    escape_radius=math.inf, # Trajectories farther than this from the origin escape
+    base_position=None, # Coordinates of the initial positions of 3D systems (their x and y are on the grid)
+    solver=DS_FATE_MAP_DEFAULT_SOLVER,
+    check_interval=DS_FATE_MAP_CHECK_INTERVAL,
+    chunk_size=DS_FATE_MAP_CHUNK_SIZE,
+    n_of_workers=1, # Number of processes integrating chunks at the same time (None for one per CPU)
+    progress: ProgressReporter=None, # Updated with the initial positions of each chunk, when it's done
+):
+    """Integrates the system from every point of a grid of initial positions and labels each
+    one with the attractor its trajectory settles on, or as escaped or undecided after
+    n_of_iterations steps. Returns a FateMap.
+
+    Positions are integrated in chunks of chunk_size, split among n_of_workers processes,
+    and every check_interval steps the trajectories that settled or escaped are dropped,
+    so that only the ones still undecided keep being integrated."""
+
+    vector_field = get_vector_field(vector_field)
+    n_of_columns, n_of_rows = (resolution, resolution) if np.isscalar(resolution) else resolution
+    x_values = np.linspace(*x_range, n_of_columns)
+    y_values = np.linspace(*y_range, n_of_rows)[::-1]
+
+    grid_x, grid_y = np.meshgrid(x_values, y_values)
+    initial_positions = np.zeros((grid_x.size, vector_field.dimension))
+    if base_position is not None:
+        initial_positions[:] = base_position
+    initial_positions[:, 0] = grid_x.ravel()
+    initial_positions[:, 1] = grid_y.ravel()
+
+    chunks = [(start, min(start + chunk_size, len(initial_positions))) for start in range(0, len(initial_positions), chunk_size)]
+
+    def get_chunk_fates(chunk_index):
+        start, end = chunks[chunk_index]
+        return get_fates(
+            vector_field, initial_positions[start:end], attractors, n_of_iterations, time_delta,
+            tolerance, escape_radius, solver, check_interval
+        )
+
+    def on_chunk_done(chunk_index):
+        if progress is not None:
+            start, end = chunks[chunk_index]
+            progress.update(end - start)
+
+    results = run_in_parallel(get_chunk_fates, len(chunks), n_of_workers, on_chunk_done)
+    labels = np.concatenate([labels for labels, n_of_steps in results]).reshape(grid_x.shape)
+    n_of_steps = np.concatenate([n_of_steps for labels, n_of_steps in results]).reshape(grid_x.shape)
+    return FateMap(labels, n_of_steps, x_values, y_values)
+
+
+def get_fates(
+    vector_field,
+    initial_positions,
+    attractors,
+    n_of_iterations,
+    time_delta=DEFAULT_TIME_DELTA,
+    tolerance=1e-2,
+    escape_radius=math.inf,
+    solver=DS_FATE_MAP_DEFAULT_SOLVER,
+    check_interval=DS_FATE_MAP_CHECK_INTERVAL,
+):
+    """Integrates the system from each initial position, all of them together, and returns
+    the label of each (see get_fate_map) and the number of steps it took to tell."""
+
+    vector_field = get_vector_field(vector_field)
+    solver = get_solver(solver)
+    states = np.array(initial_positions, dtype=float)
+    labels = np.full(len(states), DS_FATE_UNDECIDED)
+    n_of_steps = np.full(len(states), n_of_iterations)
+    undecided = np.arange(len(states)) # Indices of the trajectories still being integrated
+
+    # Escaping trajectories can overflow before being checked, and are then labeled as escaped
+    with np.errstate(over='ignore', invalid='ignore'):
+        for i in range(1, n_of_iterations + 1):
+            states = solver.step(vector_field, states, time_delta)
+            if i % check_interval == 0 or i == n_of_iterations:
+                new_labels = classify_states(states, attractors, tolerance, escape_radius)
+                is_decided = new_labels != DS_FATE_UNDECIDED
+                labels[undecided[is_decided]] = new_labels[is_decided]
+                n_of_steps[undecided[is_decided]] = i
+                undecided, states = undecided[~is_decided], states[~is_decided]
+                if len(undecided) == 0:
+                    break
+
+    return labels, n_of_steps
+
+
+def classify_states(states, attractors, tolerance=1e-2, escape_radius=math.inf):
+    """Returns the label of each state: the index of the attractor point it's within tolerance
+    of, DS_FATE_ESCAPED if it's farther than escape_radius from the origin (or not finite), or
+    DS_FATE_UNDECIDED otherwise. attractors can also be a function that takes the states and
+    returns their labels (e.g. for attractors that aren't points, like limit cycles)."""
+
+    if callable(attractors):
+        labels = np.asarray(attractors(states)).astype(int)
+    else:
+        attractors = np.asarray(attractors, dtype=float).reshape(-1, states.shape[1])
+        distances = np.linalg.norm(states[:, None, :] - attractors[None, :, :], axis=2)
+        nearest = np.argmin(np.nan_to_num(distances, nan=math.inf), axis=1)
+        labels = np.where(distances[np.arange(len(states)), nearest] < tolerance, nearest, DS_FATE_UNDECIDED)
+
+    has_escaped = ~np.isfinite(states).all(axis=1) | (np.linalg.norm(states, axis=1) > escape_radius)
+    return np.where(has_escaped, DS_FATE_ESCAPED, labels)
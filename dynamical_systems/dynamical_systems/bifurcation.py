@@ -0,0 +1,136 @@
+import numpy as np
+import math
+import os
+
+from dynamical_systems.constants import *
+from dynamical_systems.vector_fields import SystemVectorField
+from dynamical_systems.solvers import get_solver, MapSolver
+from dynamical_systems.ensemble import DynamicalSystemEnsemble
+from dynamical_systems.parallel import run_in_parallel
+from dynamical_systems.poincare import get_poincare_sections
+from dynamical_systems.progress import ProgressReporter
+
+
+
+class BifurcationDiagram:
+    """States a system settles on for each value of a parameter (see get_bifurcation_diagram).
+
+    states[i] is a recorded state of the system (without the parameter), and
+    parameter_values[i] the value of the parameter it was recorded with."""
+
+    def __init__(self, parameter_values, states):
+        self.parameter_values = parameter_values
+        self.states = states
+
+    def __len__(self):
+        return len(self.states)
+
+    def get_points(self, coordinate=0):
+        """Returns the points of the diagram for a coordinate of the states, in
+        an array of shape (n_of_points, 2) with the parameter and the coordinate."""
+
+        return np.column_stack([self.parameter_values, self.states[:, coordinate]])
+
+
+def get_parameterized_vector_field(functions, is_map=False):
+    """Takes the system functions, each taking the coordinates and then the parameter
+    (e.g. lambda x, y, z, a: ...), and returns the field of the system with the
+    parameter as an extra (last) coordinate, which stays constant. For maps (see
+    solvers.MapSolver) it's mapped to itself, otherwise its derivative is 0."""
+
+    if is_map:
+        return SystemVectorField(list(functions) + [lambda *coords_and_parameter: coords_and_parameter[-1]])
+    return SystemVectorField(list(functions) + [lambda *coords_and_parameter: 0])
+
+
+def get_bifurcation_diagram(
+    functions, # Each taking the coordinates and then the parameter (see get_parameterized_vector_field)
+    parameter_values,
+    initial_position, # Shared by every parameter value, or one for each of them
+    n_of_iterations,
+    time_delta=DEFAULT_TIME_DELTA,
+    n_of_transient_iterations=0, # Steps taken before recording, so that systems reach their attractor
+    record='maxima', # 'maxima', 'crossings' or 'states'
+    coordinate=0, # Coordinate whose local maxima are recorded ('maxima')
+    section=None, # Event function of the states of the system, e.g. get_plane_section ('crossings')
+    direction=1, # Crossings going up (1), down (-1) or both (0) ('crossings')
+    sample_interval=1, # Number of steps between two recorded states ('states')
+    solver=DS_BIFURCATION_DIAGRAM_DEFAULT_SOLVER,
+    chunk_size=DS_TRAJECTORY_CHUNK_SIZE,
+    n_of_workers=1, # Number of processes integrating parameter values at the same time (None for one per CPU)
+    progress: ProgressReporter=None, # Updated with the steps of every system
+):
+    """Integrates the system for every parameter value, all of them together, and after
+    n_of_transient_iterations steps records the states it goes through in the next n_of_iterations.
+    Returns a BifurcationDiagram. What gets recorded depends on record:
+        'maxima': the states where the given coordinate reaches a local maximum
+        'crossings': the states where the trajectory crosses the section (see get_poincare_sections)
+        'states': a state every sample_interval steps. With sample_interval=n_of_iterations, only the
+            last one, e.g. for fixed points. Discrete maps (e.g. the logistic map) can be iterated
+            with the 'map' solver.
+
+    The parameter is an extra coordinate of the states, so that each step evaluates the field
+    on every parameter value at once. Parameter values are split in a chunk per worker, and
+    maxima and crossings are found chunk_size steps at a time (so in constant memory)."""
+
+    solver = get_solver(solver)
+    vector_field = get_parameterized_vector_field(functions, is_map=isinstance(solver, MapSolver))
+    parameter_values = np.asarray(parameter_values, dtype=float)
+    dimension = vector_field.dimension - 1
+    initial_states = np.empty((len(parameter_values), dimension + 1))
+    initial_states[:, :dimension] = initial_position
+    initial_states[:, dimension] = parameter_values
+
+    if record == 'maxima':
+        # The coordinate reaches a maximum where its derivative goes from positive to negative
+        event, direction = lambda states: vector_field(states)[:, coordinate], -1
+    elif record == 'crossings':
+        assert section is not None, "Should pass a section to record crossings"
+        event = lambda states: section(states[:, :dimension])
+    elif record != 'states':
+        raise Exception(f"Unsupported record: {record}. Should be 'maxima', 'crossings' or 'states'")
+
+    n_of_workers = n_of_workers or os.cpu_count() or 1
+    chunk_length = math.ceil(len(parameter_values) / n_of_workers)
+    chunks = [(start, min(start + chunk_length, len(parameter_values))) for start in range(0, len(parameter_values), chunk_length)]
+    # Workers can't share the reporter, so their steps are added when each chunk is done
+    is_serial = n_of_workers == 1
+
+    def get_chunk_states(chunk_index):
+        start, end = chunks[chunk_index]
+        chunk_progress = progress if is_serial else None
+        if record == 'states':
+            return _sample_states(
+                vector_field, initial_states[start:end], n_of_iterations, time_delta,
+                n_of_transient_iterations, sample_interval, solver, chunk_progress
+            )
+        crossings = get_poincare_sections(
+            vector_field, initial_states[start:end], event, n_of_iterations, time_delta, direction,
+            n_of_transient_iterations, chunk_size, chunk_progress, solver=solver
+        )
+        return np.concatenate([points for points, times in crossings])
+
+    def on_chunk_done(chunk_index):
+        if progress is not None and not is_serial:
+            start, end = chunks[chunk_index]
+            progress.update((end - start) * (n_of_transient_iterations + n_of_iterations))
+
+    states = np.concatenate(run_in_parallel(get_chunk_states, len(chunks), n_of_workers, on_chunk_done))
+    return BifurcationDiagram(states[:, dimension], states[:, :dimension])
+
+
+def _sample_states(vector_field, initial_states, n_of_iterations, time_delta, n_of_transient_iterations, sample_interval, solver, progress):
+    """Returns the states every system goes through every sample_interval steps, after the transient."""
+
+    ensemble = DynamicalSystemEnsemble(initial_states, vector_field, solver=solver)
+    samples = []
+    for i in range(1 - n_of_transient_iterations, n_of_iterations + 1):
+        ensemble.step(time_delta)
+        if i > 0 and i % sample_interval == 0:
+            samples.append(ensemble.states.copy())
+        if progress is not None:
+            progress.update(len(ensemble))
+
+    if not samples:
+        return np.empty((0, initial_states.shape[1]))
+    return np.concatenate(samples)
@@ -1,7 +1,14 @@
 import numpy as np
+import importlib.util
+import os
 
-from manimlib import Rotation
-from manimlib.constants import *
+# Without manimlib (or with the DYNAMICAL_SYSTEMS_HEADLESS environment variable set)
+# only the modules that work with NumPy arrays are loaded, see engine.py
+DS_HEADLESS = bool(os.environ.get('DYNAMICAL_SYSTEMS_HEADLESS')) or importlib.util.find_spec('manimlib') is None
+
+if not DS_HEADLESS:
+    from manimlib import Rotation
+    from manimlib.constants import *
 
 
 
@@ -14,6 +21,35 @@ LOW_QUALITY_TIME_DELTA  = 0.15
 DEFAULT_TIME_DELTA = HD_TIME_DELTA
 
 
+"""Solver-related constants"""
+
+# Solver used when none is specified (see solvers.SOLVERS)
+DS_DEFAULT_SOLVER = 'euler'
+
+# Relative and absolute error tolerances of adaptive solvers
+DS_SOLVER_DEFAULT_RTOL = 1e-5
+DS_SOLVER_DEFAULT_ATOL = 1e-7
+
+# Bounds on the internal steps adaptive solvers take on each step
+DS_SOLVER_MIN_INTERNAL_STEP = 1e-9
+DS_SOLVER_MAX_INTERNAL_STEPS = 10000
+
+
+"""Trajectory cache-related constants"""
+
+# Directory where cached trajectories are stored when no other is given
+# (relative to the directory manim is run from)
+DS_TRAJECTORY_CACHE_DEFAULT_DIRECTORY = ".trajectory_cache"
+
+# Part of every cache key. Increase when a change to the integration
+# code makes previously cached trajectories invalid.
+DS_TRAJECTORY_CACHE_VERSION = 1
+
+# How deep to follow references (closures, globals, attributes) when
+# describing system functions for the cache
+DS_TRAJECTORY_CACHE_MAX_DESCRIPTION_DEPTH = 8
+
+
 """Snapshot-related constants"""
 
 # Default time domain when building dynamical system snapshots
@@ -25,6 +61,99 @@ DS_SNAPSHOT_DEFAULT_TIME_DOMAIN = [-10, 10]
 # x=0, x=1 and x=2.
 DS_PHASE_PLANE_DEFAULT_STEP = 1
 
+# Largest value the derivatives of a Bifurcation can take, so that
+# trajectories don't blow up for some values of the parameter
+DS_BIFURCATION_MAX_DERIVATIVE = 40
+
+
+"""Trace-related constants"""
+
+# Number of corners color-coded and fading traces make room for when created
+# (they grow as needed)
+DS_TRACE_INITIAL_CAPACITY = 256
+# Room fading traces keep for segments that are fading out, in units of the
+# number of segments it takes for one to fade out completely
+DS_FADE_OUT_BUFFER_SLACK = 4
+
+
+"""Event-related constants"""
+
+# Iterations refining the position of each event found along a trajectory (see engine.find_events)
+DS_EVENT_REFINEMENT_ITERATIONS = 8
+
+# Radius of the dots of a PoincareSection
+DS_POINCARE_SECTION_DOT_RADIUS = 0.01
+
+
+"""Trajectory history-related constants"""
+
+# Positions of a system to keep by default (see history.HISTORIES)
+DS_DEFAULT_TRAJECTORY_HISTORY = 'all'
+
+# Maximum number of positions kept by histories that keep the last ones
+# or a decimated trajectory, if not given
+DS_HISTORY_DEFAULT_MAX_N_OF_POINTS = 10000
+
+# Number of steps in each chunk of a streamed trajectory, if not given
+DS_TRAJECTORY_CHUNK_SIZE = 1000
+
+
+"""Lyapunov exponent-related constants"""
+
+# Solver used to integrate systems along with their tangent vectors, if not given
+DS_LYAPUNOV_DEFAULT_SOLVER = 'rk4'
+
+# Number of steps between two re-orthonormalizations of the tangent vectors, if not given
+DS_LYAPUNOV_ORTHONORMALIZATION_INTERVAL = 10
+
+# Step (relative to the size of each coordinate, or absolute below 1) of the
+# central differences used for the Jacobian of fields that don't provide it
+DS_JACOBIAN_FINITE_DIFFERENCE_STEP = 1e-6
+
+
+"""Fate map-related constants"""
+
+# Labels of the initial positions of a fate map whose trajectories escaped
+# (see escape_radius) or didn't settle on any attractor
+DS_FATE_ESCAPED = -1
+DS_FATE_UNDECIDED = -2
+
+# Solver used to integrate fate maps, if not given
+DS_FATE_MAP_DEFAULT_SOLVER = 'rk4'
+
+# Number of initial positions integrated together in each batch (and task of a worker)
+DS_FATE_MAP_CHUNK_SIZE = 2**16
+
+# Number of steps between two checks of which trajectories settled or escaped
+DS_FATE_MAP_CHECK_INTERVAL = 20
+
+# Colors of the attractors of fate map images (in order, repeating them if needed),
+# and of escaped and undecided positions
+DS_FATE_MAP_COLORS = ['#3e99a0', '#e07a5f', '#f2cc8f', '#81b29a', '#9d79bc', '#5b8def']
+DS_FATE_MAP_ESCAPED_COLOR = '#000000'
+DS_FATE_MAP_UNDECIDED_COLOR = '#444444'
+
+
+"""Bifurcation diagram-related constants"""
+
+# Solver used to integrate the systems of a bifurcation diagram, if not given
+DS_BIFURCATION_DIAGRAM_DEFAULT_SOLVER = 'rk4'
+
+# Radius of the dots of a BifurcationDiagramCloud
+DS_BIFURCATION_DIAGRAM_DOT_RADIUS = 0.005
+
+
+"""Progress reporting-related constants"""
+
+# How builds are reported by default (see progress.get_progress_reporter) - 'log'
+# (to the DS_PROGRESS_LOGGER_NAME logger), a function or False (not reported)
+DS_DEFAULT_PROGRESS = 'log'
+DS_PROGRESS_LOGGER_NAME = 'dynamical_systems'
+
+# Minimum number of seconds between two reports of the progress of a build.
+# Builds that take less than this aren't reported at all.
+DS_PROGRESS_REPORT_INTERVAL = 2
+
 
 """Velocity color-coding-related constants"""
 
@@ -32,10 +161,14 @@ DS_PHASE_PLANE_DEFAULT_STEP = 1
 # a system from its trace
 DS_TRACE_COLOR_CODING_N_OF_ITERATIONS = 200
 
-# Number of iterations of the system to calculate when color coding
-# a system from its trace
+# Bounds of the grid (on every axis) where to evaluate the system when
+# color coding it from plane points
 DS_PLANE_COLOR_CODING_VALUES_RANGE = 10
 
+# Number of points on each axis of the grid where to evaluate the system
+# when color coding it from plane points
+DS_PLANE_COLOR_CODING_GRID_RESOLUTION = 20
+
 # Number of intermediate colors between the given 'slow' and 'medium', and
 # 'medium' and 'fast' colors
 DS_COLOR_CODING_VARIETY = 20
@@ -79,7 +212,7 @@ EXP_SCENE_DEFAULT_TRACE_OVERLAP_BUFF = 0.0225
 EXP_SCENE_DEFAULT_CAMERA_ROTATION_RATE = 0.00375 # 0.003
 
 # Default initial rotation of the camera
-EXP_SCENE_DEFAULT_CAMERA_ROTATION = Rotation.from_rotvec(
+EXP_SCENE_DEFAULT_CAMERA_ROTATION = None if DS_HEADLESS else Rotation.from_rotvec(
     np.pi/4 * np.array([0, 0, 1])
 ) * Rotation.from_rotvec(np.pi/4 * np.array([1, 0, 0]))
 
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+
+def get_decimated_indices(points, tolerance):
+    """Returns the indices of the points to keep so that the polyline through them
+    stays within tolerance of the one through every point (Ramer-Douglas-Peucker).
+
+    Straight stretches end up with very few points while curved ones keep as many
+    as they need. Instead of recursing on each stretch, every stretch that still has
+    to be split is handled at once on each round, so the work is done on whole arrays."""
+
+    points = np.asarray(points, dtype=float)
+    n_of_points = len(points)
+    if n_of_points <= 2 or not tolerance:
+        return np.arange(n_of_points)
+
+    keep = np.zeros(n_of_points, dtype=bool)
+    keep[[0, -1]] = True
+    starts = np.array([0])
+    ends = np.array([n_of_points - 1])
+
+    while len(starts) > 0:
+        n_of_inner_points = ends - starts - 1
+        has_inner_points = n_of_inner_points > 0
+        starts, ends, n_of_inner_points = starts[has_inner_points], ends[has_inner_points], n_of_inner_points[has_inner_points]
+        if len(starts) == 0:
+            break
+
+        # Indices of the inner points of every stretch, one stretch after the other
+        stretch_indices = np.repeat(np.arange(len(starts)), n_of_inner_points)
+        first_positions = np.cumsum(n_of_inner_points) - n_of_inner_points
+        inner_indices = starts[stretch_indices] + 1 + np.arange(len(stretch_indices)) - first_positions[stretch_indices]
+
+        distances = get_distances_to_segments(
+            points[inner_indices], points[starts[stretch_indices]], points[ends[stretch_indices]]
+        )
+        max_distances = np.maximum.reduceat(distances, first_positions)
+
+        # The farthest point of each stretch splits it in two, if it's too far
+        farthest = np.flatnonzero(distances == max_distances[stretch_indices])
+        _, first_farthest = np.unique(stretch_indices[farthest], return_index=True)
+        splits = inner_indices[farthest[first_farthest]]
+
+        should_split = max_distances > tolerance
+        splits = splits[should_split]
+        keep[splits] = True
+        starts, ends = np.concatenate([starts[should_split], splits]), np.concatenate([splits, ends[should_split]])
+
+    return np.flatnonzero(keep)
+
+
+def decimate_trajectory(points, tolerance, *arrays):
+    """Returns the points that get_decimated_indices keeps, along with the same
+    entries of any other arrays with a value per point (e.g. derivatives)."""
+
+    indices = get_decimated_indices(points, tolerance)
+    if not arrays:
+        return np.asarray(points)[indices]
+    return (np.asarray(points)[indices], *[None if a is None else np.asarray(a)[indices] for a in arrays])
+
+
+def get_distances_to_segments(points, starts, ends):
+    """Returns the distance from each point to the segment from the start to the end
+    in the same position (arrays of shape (n_of_points, dimension))."""
+
+    segments = ends - starts
+    squared_lengths = np.einsum('ij,ij->i', segments, segments)
+    offsets = points - starts
+    # Position of the closest point of each segment (0 at its start and 1 at its end)
+    fractions = np.divide(
+        np.einsum('ij,ij->i', offsets, segments), squared_lengths,
+        out=np.zeros(len(points)), where=squared_lengths > 0
+    )
+    closest_offsets = offsets - np.clip(fractions, 0, 1)[:, None] * segments
+    return np.sqrt(np.einsum('ij,ij->i', closest_offsets, closest_offsets))
@@ -1,12 +1,28 @@
 import numpy as np
 import math
 import copy
+import hashlib
+import os
+import tempfile
 
 from manimlib import *
 from dynamical_systems.constants import *
 from dynamical_systems.base_dynamical_system import *
+from dynamical_systems.ensemble import *
+from dynamical_systems.parallel import *
+from dynamical_systems.engine import *
+from dynamical_systems.poincare import *
+from dynamical_systems.basins import *
+from dynamical_systems.bifurcation import *
+from dynamical_systems.history import *
+from dynamical_systems.decimation import *
+from dynamical_systems.profiling import *
+from dynamical_systems.progress import *
+from dynamical_systems.symbolic import *
+from dynamical_systems.trajectory_cache import *
 from typing import List
 from colour import Color
+from PIL import Image
 
 
 class DynamicalSystemSnapshot(BaseDynamicalSystem):
@@ -20,100 +36,136 @@ class DynamicalSystemSnapshot(BaseDynamicalSystem):
         scene,
         init_pos,
         time_domain, 
-        dx, 
-        dy, 
+        dx=None, 
+        dy=None, 
         dz=None, 
         show_point=True, 
         color_code_velocity=False, 
         fade_out_trace=False,
         style=BASE_STYLE,
+        precomputed_solution=None, # (backward_points, forward_points), e.g. integrated by a DynamicalSystemEnsemble
         **kwargs
     ):
         assert time_domain[0] <= 0 and time_domain[1] >= 0, "Time domain of the system must contain t=0"
         self.time_domain = time_domain
         self.color_code_velocity = color_code_velocity
+        self.precomputed_solution = precomputed_solution
         super().__init__(scene, init_pos, dx, dy, dz, show_point, color_code_velocity, fade_out_trace, style, **kwargs)
 
 
     def build_solution(self):
-        self.forward_trace = self._build_solution_piece(is_forward=True)
-        self.extreme_point_forward = self.get_np_array_from_list(copy.deepcopy(self.coords))
+        if self.precomputed_solution is not None:
+            backward_points, forward_points = self.precomputed_solution
+            self.forward_trace = self._build_solution_piece_from_points(forward_points)
+            self.extreme_point_forward = self.get_np_array_from_list(forward_points[-1])
 
-        self.backward_trace = self._build_solution_piece(is_forward=False)
-        self.extreme_point_backward = self.get_np_array_from_list(copy.deepcopy(self.coords))
+            self.backward_trace = self._build_solution_piece_from_points(backward_points)
+            self.extreme_point_backward = self.get_np_array_from_list(backward_points[-1])
+        else:
+            self.forward_trace = self._build_solution_piece(is_forward=True)
+            self.extreme_point_forward = self.coords.copy()
+
+            self.backward_trace = self._build_solution_piece(is_forward=False)
+            self.extreme_point_backward = self.coords.copy()
 
         self.trace = VGroup(self.trace, self.backward_trace, self.forward_trace)
         self.point = SurfaceMesh(Sphere(), resolution=(5, 5), color=self.point_color).scale(self.point_radius).move_to(self.extreme_point_forward)
 
 
-    def _build_solution_piece(self, is_forward, time_delta=DEFAULT_TIME_DELTA):
+    def _build_solution_piece(self, is_forward, time_delta=None):
         """Constructs the trace, either time-forward or time-backwards.
-        is_forward = True for forward trace, False for backward."""
-
-        # TODO: Remove trace definition inside this function and directly add corners to self.point_and_trace.trace.
-        # Comment on the todo: wasn't able to figure this out yet since adding all trace points 
-        # to a list before adding them to the trace compromises precision of the approximation
-        trace = self.get_base_trace()
-        dt = time_delta
-        self.coords = self.get_list_from_np_array(self.init_pos_vector)
-        self.last_coords = self.copy_coords(self.last_coords, self.coords)
+        is_forward = True for forward trace, False for backward.
+        Uses the system's time_delta style attribute if no time_delta is given."""
 
+        dt = time_delta or self.time_delta or DEFAULT_TIME_DELTA
         n_of_iterations = math.floor(abs(self.time_domain[is_forward]) / dt)
-        should_log_build_progress = (self.color_code_velocity and n_of_iterations > 1000) or n_of_iterations > 5000
-
-        if should_log_build_progress:
-            print(f"Building solution piece. Total of iterations to build: {n_of_iterations}")
-
-        sum_of_coords = ORIGIN
-
-        ITERATION_MODULUS = 1000
-
-        for i in range(n_of_iterations):
-            if should_log_build_progress and i % ITERATION_MODULUS == 0 and i != 0:
-                print(f"{i} iterations completed")
-
-            sum_of_coords += self.adapt_dimensions(self.last_coords)
-
-            maybe_updated_coords = self.update_coords(copy.deepcopy(self.coords), dt)
-            self.is_updated_coord_too_far = np.linalg.norm(
-                self.get_np_array_from_list(maybe_updated_coords) - self.get_np_array_from_list(self.last_coords),
-                2
-            ) > self.trace_precision_increase_threshold
-
-            if self.is_updated_coord_too_far:
-                for i in range(self.precision_multiplier_if_trace_too_rough - 1):
-                    mult = self.precision_multiplier_if_trace_too_rough
-                    self.last_coords = self.copy_coords(self.last_coords, self.coords)
-                    self.coords = self.update_coords(self.coords, dt/mult)
+        # The backward piece is integrated back in time
+        dt = dt if is_forward else -dt
+
+        cache = get_trajectory_cache(self.trajectory_cache)
+        if cache is not None:
+            key = cache.get_key(
+                vector_field=self.vector_field,
+                initial_positions=[self.init_pos_vector[:self.dimension]],
+                n_of_iterations=n_of_iterations,
+                time_delta=dt,
+                **self.get_integration_settings()
+            )
+            cached_piece = cache.load(key)
+            if cached_piece is not None:
+                return self._build_solution_piece_from_points(cached_piece['points'])
+
+        points, derivatives = self._integrate_solution_piece(n_of_iterations, dt)
+        if cache is not None:
+            cache.save(key, points=points)
+
+        return self._build_solution_piece_from_points(points, derivatives)
+
+
+    def _integrate_solution_piece(self, n_of_iterations, dt):
+        """Integrates the system from its initial position n_of_iterations times
+        and returns all the positions it went through, along with the field at each of them."""
+
+        # Adaptive solvers start off each piece the same way, so that pieces can be cached
+        self._solver.reset()
+        with profile_stage('integration', self), get_progress_reporter(self.progress, "Building solution piece", n_of_iterations) as progress:
+            trajectory = integrate_trajectory(
+                self.vector_field,
+                self.init_pos_vector[:self.dimension],
+                n_of_iterations,
+                dt,
+                progress=progress,
+                solver=self._solver,
+                **self.get_integration_settings(include_solver=False)
+            )
 
-                    self.second_to_last_coords[i] = self.copy_coords(self.second_to_last_coords[i], self.last_coords)
-                    # point = point.move_to(self.get_np_array_from_list(self.adapt_dimensions(self.last_coords)))
+        return trajectory.points, trajectory.derivatives
 
-            self.last_coords = self.copy_coords(self.last_coords, self.coords)
-            self.coords = self.update_coords(self.coords, dt/self.precision_multiplier_if_trace_too_rough if self.is_updated_coord_too_far else dt)      
 
-            if len(self.second_to_last_coords) > 0 and self.is_updated_coord_too_far:
-                mult = self.precision_multiplier_if_trace_too_rough
-                if mult > 1:
-                    for i in range(mult - 2):
-                        self.update_trace(trace, self.second_to_last_coords[i], self.second_to_last_coords[i+1])
-                self.update_trace(trace, self.last_coords, self.second_to_last_coords[mult-2])
+    def _build_solution_piece_from_points(self, points, derivatives=None):
+        """Constructs a trace from already integrated positions of the system,
+        the first of them being the initial position (see set_solution_piece_points)."""
 
-            self.update_trace(trace, self.coords, self.last_coords)
+        trace = self.get_base_trace()
+        self.set_solution_piece_points(trace, points, derivatives)
+        return trace
 
-        if should_log_build_progress:
-            print("Done building piece!")
 
-        return trace
+    def set_solution_piece_points(self, trace, points, derivatives=None):
+        """Replaces the corners of a trace of the snapshot with already integrated positions
+        of the system, the first of them being the initial position, reusing the trace mobject.
+        The field at those positions is used to color code the trace, and is evaluated here
+        if not given. Points that don't change the shape of the trace are dropped first,
+        see the trace_decimation_tolerance style attribute."""
+
+        points = np.asarray(points, dtype=float)
+        self.coords[:self.dimension] = points[-1]
+        with profile_stage('trace_update', self, n_of_items=len(points) - 1):
+            # Fading depends on the number of segments of the trace, so it keeps all of them
+            if self.trace_decimation_tolerance and not self.fade_out_trace:
+                points, derivatives = decimate_trajectory(points, self.trace_decimation_tolerance, derivatives)
+            if not (self.color_code_velocity or self.fade_out_trace):
+                trace.set_points_as_corners([self.init_pos_vector] * 2)
+                trace.add_points_as_corners(self.get_points_in_3d(points[1:]))
+                return
+
+            trace.remove_corners_after_first()
+            if self.fade_out_trace and trace.fade_out_buffer.n_of_segments_added > 0:
+                trace.fade_out_buffer = self.get_trace_fade_out_buffer()
+            if derivatives is None and self.color_code_velocity:
+                derivatives = self.vector_field(points)
+            rgbas = self.get_trace_rgbas(points[1:] if derivatives is None else derivatives[1:])
+            self.add_colored_corners_to_trace(trace, self.get_points_in_3d(points[1:]), rgbas)
+            self.refresh_trace(trace)
 
 
     def build_solution_with_time_delta(self, time_delta):
         # TODO: This method is inherently inefficient. Refactor it
         self.forward_trace = self._build_solution_piece(is_forward=True, time_delta=time_delta)
-        self.extreme_point_forward = self.get_np_array_from_list(copy.deepcopy(self.coords))
+        self.extreme_point_forward = self.coords.copy()
 
         self.backward_trace = self._build_solution_piece(is_forward=False, time_delta=time_delta)
-        self.extreme_point_backward = self.get_np_array_from_list(copy.deepcopy(self.coords))
+        self.extreme_point_backward = self.coords.copy()
 
         self.trace = VGroup(self.trace, self.backward_trace, self.forward_trace)
         self.point.move_to(self.extreme_point_forward)
@@ -124,26 +176,10 @@ class DynamicalSystemSnapshot(BaseDynamicalSystem):
 
         assert self.dimension == 2, "Can't currently calculate local sections or flow boxes for 3D systems"
 
-        self.local_section = self._calculate_local_section_or_flow_box(
-                self.get_list_from_np_array(self.init_pos_vector),
-                is_flow_box
-            )
+        self.local_section = self._calculate_local_section_or_flow_box(self.init_pos_vector, is_flow_box)
 
         self.scene.add(self.local_section).bring_to_back(self.local_section)
 
-    
-    def get_solution_through_point(self, point):
-        return DynamicalSystemSnapshot(
-            scene=self.scene,
-            init_pos=self.get_list_from_np_array(point),
-            time_domain=self.flow_box_solution_time_domain,
-            dx=self.functions[Coords.X],
-            dy=self.functions[Coords.Y],
-            dz=self.functions[Coords.Z] if self.dimension == 3 else None,
-            show_point=False,
-            color=self.flow_box_trace_color,
-            width=self.flow_box_trace_width
-        )
 
     def add_to_scene(self):
         self.scene.add(self.trace, self.point)
@@ -162,19 +198,26 @@ class DynamicalSystem(BaseDynamicalSystem):
         self,
         scene: Scene | ThreeDScene,
         init_pos: List[float],
-        dx,
-        dy,
+        dx=None,
+        dy=None,
         dz=None,
         show_point: bool=True,
         color_code_velocity=False,
         fade_out_trace=False,
         style: DynamicalSystemStyle=BASE_STYLE,
+        playback_duration=None, # If given, the trajectory is integrated beforehand in pieces of this many seconds, see TrajectoryPlayback
         **kwargs
         ):
 
-        self.d_list = [[pos_coord] for pos_coord in init_pos] # list of (x,y) coords of the system
-        self.get_point_func = self.get_point
-        self.get_trace_func = self.get_trace
+        self.playback_duration = playback_duration
+        self.playback = None
+        self._maybe_updated_coords = np.zeros(3) # Where a step would take the system, see get_point
+        if playback_duration is None:
+            self.get_point_func = self.get_point
+            self.get_trace_func = self.get_trace
+        else:
+            self.get_point_func = self.get_point_from_playback
+            self.get_trace_func = self.get_trace_from_playback
 
         super().__init__(scene, init_pos, dx, dy, dz, show_point, color_code_velocity, fade_out_trace, style, **kwargs)
 
@@ -182,46 +225,137 @@ class DynamicalSystem(BaseDynamicalSystem):
     def get_point(self, point, dt):
         """Updates coordinates of the system's point."""
 
-        maybe_updated_coords = self.update_coords(copy.deepcopy(self.coords), dt)
-        self.is_updated_coord_too_far = np.linalg.norm(
-            self.get_np_array_from_list(maybe_updated_coords) - self.get_np_array_from_list(self.last_coords),
-            2
-        ) > self.trace_precision_increase_threshold
+        with profile_stage('integration', self):
+            maybe_updated_coords = self.update_coords(self.copy_coords(self._maybe_updated_coords, self.coords), dt)
+            self.is_updated_coord_too_far = np.linalg.norm(
+                maybe_updated_coords - self.last_coords,
+                2
+            ) > self.trace_precision_increase_threshold
+
+            mult = self.precision_multiplier_if_trace_too_rough
+            self.last_coords[:] = self.coords
+            if self.is_updated_coord_too_far:
+                with profile_stage('refinement', n_of_items=mult):
+                    for i in range(mult - 1):
+                        self.update_coords(self.coords, dt/mult)
+                        self.history.add(self.coords[:self.dimension])
+                        self.second_to_last_coords[i] = self.last_coords
+                        self.last_coords[:] = self.coords
+                    self.update_coords(self.coords, dt/mult)
+            else:
+                # The step was already taken to check its length
+                self.coords[:] = maybe_updated_coords
+            self.history.add(self.coords[:self.dimension])
+
+        return point.move_to(self.coords)
+
+    def get_point_from_ensemble(self, point, ensemble: DynamicalSystemEnsemble, index):
+        """Updates coordinates of the system's point with the last step
+        taken by the ensemble, instead of integrating them here."""
+
+        if ensemble.substates is None:
+            return point
+
+        substates = ensemble.substates[:, index]
+        self.is_updated_coord_too_far = ensemble.refined[index]
 
         if self.is_updated_coord_too_far:
-            for i in range(self.precision_multiplier_if_trace_too_rough - 1):
-                mult = self.precision_multiplier_if_trace_too_rough
-                self.last_coords = self.copy_coords(self.last_coords, self.coords)
-                self.coords = self.update_coords(self.coords, dt/mult)
-                for axis in self.dimension_axes:
-                    self.d_list[axis].append(self.coords[axis])
-                self.second_to_last_coords[i] = self.copy_coords(self.second_to_last_coords[i], self.last_coords)
-                point = point.move_to(self.get_np_array_from_list(self.adapt_dimensions(self.last_coords)))
+            # Positions before each substep: the previous state and all substates but the last
+            self.second_to_last_coords[0, :self.dimension] = ensemble.previous_states[index]
+            self.second_to_last_coords[1:, :self.dimension] = substates[:-2]
+            self.history.add(substates[:-1])
+            self.last_coords[:self.dimension] = substates[-2]
+        else:
+            self.last_coords[:] = self.coords
 
-        self.last_coords = self.copy_coords(self.last_coords, self.coords)
-        self.coords = self.update_coords(self.coords, dt/self.precision_multiplier_if_trace_too_rough if self.is_updated_coord_too_far else dt)
-        for axis in self.dimension_axes:
-            self.d_list[axis].append(self.coords[axis])
+        self.coords[:self.dimension] = substates[-1]
+        self.history.add(substates[-1])
+        if self.color_code_velocity:
+            # The ensemble evaluates the field once for every system, and reuses it for the next step
+            self._coords_derivative = (tuple(self.coords[:self.dimension]), ensemble.get_derivatives()[index])
+
+        return point.move_to(self.coords)
+
+    def follow_ensemble(self, ensemble: DynamicalSystemEnsemble, index):
+        """Makes the system take its coordinates from the system in the given
+        index of an ensemble, which should be stepped once per frame."""
+
+        # Only this system's updaters are swapped, whatever pausing does in subclasses
+        DynamicalSystem.pause_update(self)
+        self.get_point_func = lambda point, dt: self.get_point_from_ensemble(point, ensemble, index)
+        self.get_trace_func = self.get_trace
+        DynamicalSystem.resume_update(self)
 
-        return point.move_to(self.get_np_array_from_list(self.adapt_dimensions(self.coords)))
+    def get_point_from_playback(self, point, dt):
+        """Updates coordinates of the system's point with the positions
+        it went through during dt, taken from the precomputed trajectory."""
+
+        with profile_stage('integration', self):
+            points, derivatives = self.playback.advance(dt)
+        if len(points) == 0:
+            return point
+
+        self.history.add(points)
+        points = self.get_points_in_3d(points)
+        self._played_points = points
+        self._played_derivatives = derivatives
+
+        self.last_coords[:] = points[-2] if len(points) > 1 else self.coords
+        self.coords[:] = points[-1]
+
+        return point.move_to(self.coords)
+
+    def get_trace_from_playback(self, trace):
+        """Adds the positions played back on this frame to the system's trace."""
+
+        with profile_stage('trace_update', self, n_of_items=len(self._played_points)):
+            if len(self._played_points) > 0:
+                if self.color_code_velocity or self.fade_out_trace:
+                    self.add_colored_corners_to_trace(trace, self._played_points, self.get_trace_rgbas(self._played_derivatives))
+                else:
+                    trace.add_points_as_corners(self._played_points)
+                self._played_points = self._played_points[:0]
+
+            self.refresh_trace(trace)
+        self.scene.bring_to_front(self.trace)
 
     def get_trace(self, trace):
         """Updates coordinates of the system's trace."""
             
-        if len(self.second_to_last_coords) > 0 and self.is_updated_coord_too_far:
-            mult = self.precision_multiplier_if_trace_too_rough
-            if mult > 1:
-                for i in range(mult - 2):
-                    self.update_trace(trace, self.second_to_last_coords[i], self.second_to_last_coords[i+1])
-            self.update_trace(trace, self.last_coords, self.second_to_last_coords[mult-2])
+        n_of_new_corners = self.precision_multiplier_if_trace_too_rough if self.is_updated_coord_too_far else 1
+        with profile_stage('trace_update', self, n_of_items=n_of_new_corners):
+            if len(self.second_to_last_coords) > 0 and self.is_updated_coord_too_far:
+                mult = self.precision_multiplier_if_trace_too_rough
+                if mult > 1:
+                    for i in range(mult - 2):
+                        self.update_trace(trace, self.second_to_last_coords[i], self.second_to_last_coords[i+1])
+                self.update_trace(trace, self.last_coords, self.second_to_last_coords[mult-2])
 
 
-        self.update_trace(trace, self.coords, self.last_coords)
+            self.update_trace(trace, self.coords, self.last_coords)
+            self.refresh_trace(trace)
         self.scene.bring_to_front(self.trace)
 
         # print("Trace updated - moved to", [round(c, 7) for c in self.coords], "from", [round(c, 7) for c in self.last_coords], '\n')
 
     def build_solution(self):
+        # Positions the system goes through (or the ones the trajectory_history style attribute keeps).
+        # Set up here, before adding the updaters, since they can get called right away
+        self.history = get_trajectory_history(self.trajectory_history, self.dimension)
+        self.history.add(self.init_pos_vector[:self.dimension])
+
+        if self.playback_duration is not None:
+            self.playback = TrajectoryPlayback(
+                self.vector_field,
+                self.init_pos_vector[:self.dimension],
+                self.playback_duration,
+                self.time_delta or DEFAULT_TIME_DELTA,
+                solver=self._solver,
+                **self.get_integration_settings(include_solver=False)
+            )
+            self._played_points = np.empty((0, 3))
+            self._played_derivatives = np.empty((0, self.dimension))
+
         # self.point_and_trace.add_updater(self.point_and_trace_func)
         self.point.add_updater(self.get_point_func)
         self.trace.add_updater(self.get_trace_func)
@@ -242,99 +376,95 @@ class DynamicalSystem(BaseDynamicalSystem):
 
         assert self.dimension == 2, "Can't currently calculate local sections for 3D systems"
 
-        def update_local_section(is_flow_box):
-            return self._calculate_local_section_or_flow_box(
-                [self.d_list[i][-self._d_list_length_on_section_added] for i in range(len(self.d_list))],
-                is_flow_box
-            )
+        def get_section_position():
+            # The section follows the system's path from its initial position, as many positions
+            # behind it as the system had gone through when the section was added
+            return self.history.get_point(self.history.n_of_points_added - self._history_length_on_section_added)
 
-        self._d_list_length_on_section_added = len(self.d_list[0])
-        local_section_updater_function = lambda : update_local_section(is_flow_box)
-        self.local_section = always_redraw(local_section_updater_function)
+        self._history_length_on_section_added = self.history.n_of_points_added
+        # The section is moved in place instead of being rebuilt on every frame
+        self.local_section = self._calculate_local_section_or_flow_box(get_section_position(), is_flow_box)
+        self.local_section.add_updater(lambda m: m.move_section_to(get_section_position()))
 
         self.scene.add(self.local_section)#.bring_to_front(self.local_section)
-    
-
-    def get_solution_through_point(self, point):
-        return DynamicalSystemSnapshot(
-            scene=self.scene,
-            init_pos=self.get_list_from_np_array(point),
-            time_domain=self.flow_box_solution_time_domain,
-            dx=self.functions[Coords.X],
-            dy=self.functions[Coords.Y],
-            dz=self.functions[Coords.Z] if self.dimension == 3 else None,
-            show_point=False,
-            color=self.flow_box_trace_color,
-            width=self.flow_box_trace_width
-        )
 
 
 class BilateralDynamicalSystem(DynamicalSystem):
-    """Time-forward and time-backwards dynamical system."""
+    """Time-forward and time-backwards dynamical system.
+
+    Both halves are integrated together, as an ensemble of two systems moving in opposite
+    directions in time, so each stage of the solver evaluates the field once for both
+    and they stay in lockstep. The forward half is the system itself."""
+
+    # Direction in time of each half, in the order of get_halves
+    TIME_DIRECTIONS = [1, -1]
 
     def __init__(
         self, 
         scene, 
         init_pos, 
-        dx, 
-        dy, 
+        dx=None, 
+        dy=None, 
         dz=None, 
         show_point=True, 
         color_code_velocity=False, 
         style=BASE_STYLE, 
         **kwargs
     ):
-        super().__init__(scene, init_pos, dx, dy, dz, show_point, color_code_velocity, fade_out_trace=False, style=style, **kwargs)
-        
-        backwards_functions = self.get_backwards_functions()
+        assert kwargs.get('playback_duration') is None, "Bilateral systems are integrated as they're shown, and can't be played back"
+        vector_field = kwargs.pop('vector_field', None)
+        super().__init__(scene, init_pos, dx, dy, dz, show_point, color_code_velocity, fade_out_trace=False, style=style, vector_field=vector_field, **kwargs)
 
         self.forward_system = self
         self.backwards_system = DynamicalSystem(
             scene=scene,
             init_pos=init_pos,
-            dx=backwards_functions[Coords.X],
-            dy=backwards_functions[Coords.Y],
-            dz=backwards_functions[Coords.Z],
             show_point=show_point,
             color_code_velocity=color_code_velocity,
             fade_out_trace=False,
             style=style,
+            vector_field=self.vector_field,
             **kwargs
         )
 
+        self.ensemble = DynamicalSystemEnsemble(
+            initial_positions=[init_pos, init_pos],
+            time_directions=self.TIME_DIRECTIONS,
+            vector_field=self.vector_field,
+            **self.get_integration_settings()
+        )
+        self.ensemble_stepper = VGroup()
+        self.ensemble_stepper.add_updater(lambda m, dt: self.ensemble.step(dt))
+        for index, system in enumerate(self.get_halves()):
+            system.follow_ensemble(self.ensemble, index)
 
-    def get_backwards_functions(self):
-        if self.dimension == 2:
-            return [
-                lambda x,y: -self.functions[Coords.X](x,y),
-                lambda x,y: -self.functions[Coords.Y](x,y),
-                None
-            ]
-        else:
-            return [
-                lambda x,y,z: -self.functions[Coords.X](x,y,z),
-                lambda x,y,z: -self.functions[Coords.Y](x,y,z),
-                lambda x,y,z: -self.functions[Coords.Z](x,y,z),
-            ]
+
+    def get_halves(self):
+        return [self.forward_system, self.backwards_system]
 
 
     def add_to_scene(self):
+        # The ensemble is stepped before the halves take their positions from it
         self.scene.add(
+            self.ensemble_stepper,
             self.forward_system.trace, self.backwards_system.trace,
             self.forward_system.point, self.backwards_system.point
         )
 
 
     def pause_update(self, pause_only_backward=False):
-        self.backwards_system.pause_update()
-        if not pause_only_backward:
-            self.forward_system.pause_update()
+        for index, system in enumerate(self.get_halves()):
+            if system is self.backwards_system or not pause_only_backward:
+                DynamicalSystem.pause_update(system)
+                # Paused halves stay put in the ensemble
+                self.ensemble.set_time_direction(index, 0)
 
 
     def resume_update(self, resume_only_backward=False):
-        self.backwards_system.resume_update()
-        if not resume_only_backward:
-            self.forward_system.resume_update()
+        for index, system in enumerate(self.get_halves()):
+            if system is self.backwards_system or not resume_only_backward:
+                DynamicalSystem.resume_update(system)
+                self.ensemble.set_time_direction(index, self.TIME_DIRECTIONS[index])
 
 
 class DynamicalSystemFamily:
@@ -345,8 +475,8 @@ class DynamicalSystemFamily:
         self,
         scene,
         initial_positions,
-        dx,
-        dy,
+        dx=None,
+        dy=None,
         dz=None,
         time_domain=DS_SNAPSHOT_DEFAULT_TIME_DOMAIN,
         show_snapshots=False, # Whether to show a DynamicalSystemSnapshot (True) or DynamicalSystem (False)
@@ -356,47 +486,136 @@ class DynamicalSystemFamily:
         lower_quality=False,
         style=BASE_STYLE,
         color=BASE_STYLE.color, # can either be a single color or a list of colors to fade
+        ensemble=False, # Whether to integrate all systems together, as a single DynamicalSystemEnsemble
+        n_of_workers=1, # Number of processes integrating the snapshots (None for one per CPU)
+        vector_field: SystemVectorField=None, # Can be given instead of dx, dy and dz (see compile_vector_field)
         **kwargs
     ):
         self.scene = scene
         self.systems = []
         self.initial_positions = initial_positions
+        if vector_field is None and (dx is None or dy is None):
+            raise ValueError("Should pass either dx and dy (and maybe dz) or a vector_field")
+        self.vector_field = vector_field if vector_field is not None else SystemVectorField([dx, dy, dz])
+        self.ensemble = None
+        self.ensemble_stepper = None
 
         colors = self.generate_color_gradient(color)
+        progress = self.get_style_value('progress', style, **kwargs)
+        kwargs['progress'] = False # The family reports the progress of its systems as a whole
 
-        # Generate systems
-        should_log_build_progress = (show_snapshots or color_code_velocity or fade_out_trace) and len(self.initial_positions) > 10
-        if should_log_build_progress:
-            print(f"Total of systems to build: {len(self.initial_positions)}")
-        for i, init_pos in enumerate(self.initial_positions):
-            if should_log_build_progress and i % 10 == 0 and i != 0:
-                print(f"Built {i} systems")
-            parameters = dict(
-                    scene=scene,
-                    init_pos=init_pos,
-                    dx=dx,
-                    dy=dy,
-                    dz=dz,
-                    show_point=show_points,
-                    color_code_velocity=color_code_velocity,
-                    fade_out_trace=fade_out_trace,
-                    style=style,
-                    color=colors[i],
-                    **kwargs
-            )
+        precomputed_solutions = None
+        # Snapshots integrated in parallel are split among the workers as ensembles too
+        if ensemble or (show_snapshots and n_of_workers != 1):
+            self.ensemble = self.get_ensemble(style, **kwargs)
             if show_snapshots:
-                parameters['time_domain'] = time_domain
-                solution = DynamicalSystemSnapshot(**parameters)
-                if lower_quality:
-                    solution.build_solution_with_time_delta(LOW_QUALITY_TIME_DELTA)
+                time_delta = LOW_QUALITY_TIME_DELTA if lower_quality else self.get_style_value('time_delta', style, **kwargs)
+                cache = get_trajectory_cache(self.get_style_value('trajectory_cache', style, **kwargs))
+                precomputed_solutions = self.get_ensemble_solutions(time_domain, time_delta, cache, n_of_workers, progress)
             else:
-                solution = DynamicalSystem(**parameters)
-            self.systems.append(solution)
+                self.ensemble_stepper = VGroup()
+                self.ensemble_stepper.add_updater(lambda m, dt: self.ensemble.step(dt))
+
+        # Systems color coded from plane points all get the same limit, so it's calculated only once
+        color_coding_limit = kwargs.pop('color_coding_limit', None)
+        if color_code_velocity == 'from_plane' and color_coding_limit is None:
+            color_coding_limit = SystemColorManager().get_color_coding_limit_from_plane_points(
+                self.vector_field,
+                self.get_style_value('color_coding_grid_range', style, **kwargs),
+                self.get_style_value('color_coding_grid_resolution', style, **kwargs)
+            )
 
-        if should_log_build_progress:
-            print("Done!")
+        # Generate systems
+        with get_progress_reporter(progress, "Building systems", len(self.initial_positions), unit='systems') as reporter:
+            for i, init_pos in enumerate(self.initial_positions):
+                parameters = dict(
+                        scene=scene,
+                        init_pos=init_pos,
+                        vector_field=self.vector_field,
+                        show_point=show_points,
+                        color_code_velocity=color_code_velocity,
+                        fade_out_trace=fade_out_trace,
+                        style=style,
+                        color=colors[i],
+                        color_coding_limit=color_coding_limit,
+                        **kwargs
+                )
+                if show_snapshots:
+                    parameters['time_domain'] = time_domain
+                    if precomputed_solutions is not None:
+                        solution = DynamicalSystemSnapshot(**parameters, precomputed_solution=precomputed_solutions[i])
+                    else:
+                        solution = DynamicalSystemSnapshot(**parameters)
+                        if lower_quality:
+                            solution.build_solution_with_time_delta(LOW_QUALITY_TIME_DELTA)
+                else:
+                    solution = DynamicalSystem(**parameters)
+                    if self.ensemble is not None:
+                        solution.follow_ensemble(self.ensemble, i)
+                self.systems.append(solution)
+                reporter.update()
+
+    def get_style_value(self, trait, style, **kwargs):
+        """Returns the value of a style attribute for the systems of the family,
+        which can be overridden through keyword arguments."""
+
+        value = kwargs[trait] if trait in kwargs else style.get_value(trait)
+        return value if value is not None else BASE_STYLE.get_value(trait)
+
+    def get_ensemble(self, style, **kwargs):
+        """Builds an ensemble holding the states of every system of the family."""
+
+        return DynamicalSystemEnsemble(
+            initial_positions=self.initial_positions,
+            vector_field=self.vector_field,
+            speed_rate=self.get_style_value('speed_rate', style, **kwargs),
+            precision_multiplier_if_trace_too_rough=self.get_style_value('precision_multiplier_if_trace_too_rough', style, **kwargs),
+            trace_precision_increase_threshold=self.get_style_value('trace_precision_increase_threshold', style, **kwargs),
+            solver=self.get_style_value('solver', style, **kwargs),
+        )
+
+    def get_ensemble_solutions(self, time_domain, time_delta, cache: TrajectoryCache=None, n_of_workers=1, progress=None):
+        """Integrates the forward and backward pieces of every snapshot at once,
+        in n_of_workers processes (see integrate_in_parallel), reporting the steps of
+        every system as a whole (progress being the value of the progress style attribute).
+        Returns a (backward_points, forward_points) pair for each system."""
+
+        n_of_systems = len(self.ensemble.initial_states)
+        n_of_iterations_per_piece = [math.floor(abs(time_domain[is_forward]) / time_delta) for is_forward in [False, True]]
+        solutions = []
+        with get_progress_reporter(progress, "Integrating snapshots", n_of_systems * sum(n_of_iterations_per_piece)) as reporter:
+            # The backward pieces are integrated back in time
+            for n_of_iterations, piece_time_delta in zip(n_of_iterations_per_piece, [-time_delta, time_delta]):
+                if cache is not None:
+                    key = cache.get_key(
+                        vector_field=self.ensemble.vector_field,
+                        initial_positions=self.ensemble.initial_states,
+                        n_of_iterations=n_of_iterations,
+                        time_delta=piece_time_delta,
+                        speed_rate=self.ensemble.speed_rate,
+                        precision_multiplier_if_trace_too_rough=self.ensemble.precision_multiplier_if_trace_too_rough,
+                        trace_precision_increase_threshold=self.ensemble.trace_precision_increase_threshold,
+                        solver=self.ensemble.solver,
+                    )
+                    cached_pieces = cache.load(key)
+                    if cached_pieces is not None:
+                        # Pieces are stored one after the other, along with their lengths
+                        split_indices = np.cumsum(cached_pieces['lengths'])[:-1]
+                        solutions.append(np.split(cached_pieces['points'], split_indices))
+                        reporter.update(n_of_systems * n_of_iterations)
+                        continue
+
+                self.ensemble.solver.reset()
+                pieces = integrate_in_parallel(self.ensemble, n_of_iterations, piece_time_delta, n_of_workers, reporter)
+                if cache is not None:
+                    cache.save(key, points=np.concatenate(pieces), lengths=np.array([len(p) for p in pieces]))
+                solutions.append(pieces)
+
+        return list(zip(*solutions))
 
     def add_to_scene(self):
+        if self.ensemble_stepper is not None:
+            self.scene.add(self.ensemble_stepper)
         for system in self.systems:
             system.add_to_scene()
 
@@ -427,13 +646,12 @@ class DynamicalSystemFamily:
 class PhasePlane(DynamicalSystemFamily):
     """Draws a 2D phase plane of the given system."""
 
-    # TODO: calculate color coding limit once and pass it to each system
     def __init__(
         self,
         scene,
         plane,
-        dx,
-        dy,
+        dx=None,
+        dy=None,
         time_domain=DS_SNAPSHOT_DEFAULT_TIME_DOMAIN,
         step=DS_PHASE_PLANE_DEFAULT_STEP,
         show_snapshots=False, # Whether to show DynamicalSystemSnapshot's (True) or DynamicalSystem's (False)
@@ -471,6 +689,8 @@ class PhasePlane(DynamicalSystemFamily):
     
     
     def add_to_scene(self):
+        if self.ensemble_stepper is not None:
+            self.scene.add(self.ensemble_stepper)
         for system in self.systems:
             self.scene.add(system.trace)
 
@@ -480,6 +700,15 @@ class PhasePlane(DynamicalSystemFamily):
 
 
 class Bifurcation(PhasePlane):
+    """Phase plane of a system with a parameter (a DecimalNumber its functions read) that
+    increases over time, showing the trajectory through each position of the plane for the
+    current value of the parameter.
+
+    The trajectories of every position are integrated together, as a single ensemble, and
+    written into the traces of the same snapshots on each frame. They're only integrated again
+    when the parameter changes, and adaptive solvers (e.g. 'rk45') start off from the step size
+    they ended up with for the previous value."""
+
     def __init__(
         self,
         scene,
@@ -494,41 +723,165 @@ class Bifurcation(PhasePlane):
         **kwargs
         ):
 
-        BIFURCATION_MAX_VALUE = 40
-
-        self.scene = scene
-        # self.parameter = parameter # Should be a DecimalNumber
-        self.dx = lambda x,y: dx(x,y) if dx(x,y) <= BIFURCATION_MAX_VALUE else BIFURCATION_MAX_VALUE
-        self.dy = lambda x,y: dy(x,y) if dy(x,y) <= BIFURCATION_MAX_VALUE else BIFURCATION_MAX_VALUE
+        self.parameter = parameter
         self.plane = plane
         self.time_domain = time_domain
         self.color_code_velocity = color_code_velocity
         self.style = style
         self.lower_quality = lower_quality
+        # Derivatives are clamped so that trajectories don't blow up for some values of the parameter
+        self.dx, self.dy = [
+            (lambda f: lambda x,y: np.minimum(f(x,y), DS_BIFURCATION_MAX_DERIVATIVE))(f) for f in [dx, dy]
+        ]
 
-        parameter.add_updater(lambda n, dt: n.set_value(n.get_value() + 0.1*dt))
-        self.phase_plane = always_redraw(lambda : self.get_updated_phase_plane())
-
-
-    def get_phase_plane(self):
-        return PhasePlane(
-            scene=self.scene,
-            plane=self.plane,
-            dx=self.dx,
-            dy=self.dy,
+        super().__init__(
+            scene=scene,
+            plane=plane,
+            time_domain=time_domain,
             show_snapshots=True,
             show_points=False,
-            time_domain=self.time_domain,
-            color_code_velocity=self.color_code_velocity,
-            lower_quality=self.lower_quality,
-            style=self.style
+            color_code_velocity=color_code_velocity,
+            lower_quality=lower_quality,
+            style=style,
+            ensemble=True,
+            vector_field=SystemVectorField([self.dx, self.dy]),
+            **kwargs
         )
+        self.time_delta = LOW_QUALITY_TIME_DELTA if lower_quality else self.get_style_value('time_delta', style, **kwargs)
+        self.n_of_iterations = math.floor(time_domain[1] / self.time_delta)
+        self.parameter_value = parameter.get_value() # Value the traces were integrated with
+
+        parameter.add_updater(lambda n, dt: n.set_value(n.get_value() + 0.1*dt))
+        self.phase_plane = VGroup(*[s.forward_trace for s in self.systems])
+        self.phase_plane.add_updater(lambda m: self.update_traces())
+
+
+    def update_traces(self):
+        """Integrates the trajectories again if the parameter changed, and writes them into the traces."""
+
+        parameter_value = self.parameter.get_value()
+        if parameter_value == self.parameter_value:
+            return
+        self.parameter_value = parameter_value
+
+        self.ensemble.reset()
+        if self.color_code_velocity:
+            points, derivatives = self.ensemble.integrate(self.n_of_iterations, self.time_delta, with_derivatives=True)
+        else:
+            points = self.ensemble.integrate(self.n_of_iterations, self.time_delta)
+            derivatives = [None] * len(points)
 
-    def get_updated_phase_plane(self):
-        system = self.get_phase_plane()
-        mobjs = [s.forward_trace for s in system.systems]
-        return VGroup(*mobjs)
+        for system, system_points, system_derivatives in zip(self.systems, points, derivatives):
+            system.set_solution_piece_points(system.forward_trace, system_points, system_derivatives)
+            system.extreme_point_forward = system.coords.copy()
 
 
     def add_to_scene(self):
         self.scene.add(self.phase_plane)
+
+
+class PoincareSection(DotCloud):
+    """Point cloud of the positions where trajectories of a system cross a section (an event
+    function, e.g. get_plane_section) in the given direction, see get_poincare_sections."""
+
+    def __init__(
+        self,
+        initial_positions,
+        section,
+        n_of_iterations,
+        dx=None,
+        dy=None,
+        dz=None,
+        time_delta=DEFAULT_TIME_DELTA,
+        direction=1,
+        n_of_transient_iterations=0,
+        color=BASE_STYLE.color,
+        radius=DS_POINCARE_SECTION_DOT_RADIUS,
+        vector_field: SystemVectorField=None, # Can be given instead of dx, dy and dz (see compile_vector_field)
+        **integration_settings # See DynamicalSystemEnsemble, e.g. solver
+    ):
+        self.vector_field = vector_field if vector_field is not None else SystemVectorField([dx, dy, dz])
+        # (crossing_points, crossing_times) of each trajectory
+        self.crossings = get_poincare_sections(
+            self.vector_field,
+            initial_positions,
+            section,
+            n_of_iterations,
+            time_delta,
+            direction,
+            n_of_transient_iterations,
+            **integration_settings
+        )
+
+        points = np.concatenate([points for points, times in self.crossings])
+        points = np.hstack([points, np.zeros((len(points), 3 - points.shape[1]))])
+        super().__init__(points, color=color, radius=radius)
+
+
+class FateMapImage(ImageMobject):
+    """Image of a fate map (see get_fate_map), with a color for the basin of each attractor.
+    Positions can be shaded by how long their trajectories took to settle (darker the longer).
+    If a plane is given, the image covers the region of the plane the grid covers."""
+
+    def __init__(
+        self,
+        fate_map: FateMap,
+        plane: NumberPlane=None,
+        colors=DS_FATE_MAP_COLORS,
+        escaped_color=DS_FATE_MAP_ESCAPED_COLOR,
+        undecided_color=DS_FATE_MAP_UNDECIDED_COLOR,
+        shade_by_n_of_steps=False,
+        **kwargs
+    ):
+        self.fate_map = fate_map
+        labels = fate_map.labels
+        palette = np.array([color_to_rgba(color) for color in colors])
+        rgbas = palette[np.maximum(labels, 0) % len(palette)]
+        rgbas[labels == DS_FATE_ESCAPED] = color_to_rgba(escaped_color)
+        rgbas[labels == DS_FATE_UNDECIDED] = color_to_rgba(undecided_color)
+        if shade_by_n_of_steps:
+            rgbas[..., :3] *= 1 - 0.6 * fate_map.n_of_steps[..., None] / max(fate_map.n_of_steps.max(), 1)
+
+        # Images are loaded from files, named after their contents
+        pixels = np.round(255 * rgbas).astype(np.uint8)
+        image_path = os.path.join(tempfile.gettempdir(), f"fate_map_{hashlib.sha256(pixels.tobytes()).hexdigest()[:16]}.png")
+        if not os.path.exists(image_path):
+            Image.fromarray(pixels, 'RGBA').save(image_path)
+        super().__init__(image_path, **kwargs)
+
+        if plane is not None:
+            # Each pixel is centered on its position of the grid
+            x_values, y_values = fate_map.x_values, fate_map.y_values
+            x_margin = abs(x_values[-1] - x_values[0]) / max(len(x_values) - 1, 1) / 2
+            y_margin = abs(y_values[-1] - y_values[0]) / max(len(y_values) - 1, 1) / 2
+            lower_left = plane.c2p(x_values.min() - x_margin, y_values.min() - y_margin)
+            upper_right = plane.c2p(x_values.max() + x_margin, y_values.max() + y_margin)
+            self.set_width(upper_right[0] - lower_left[0], stretch=True)
+            self.set_height(upper_right[1] - lower_left[1], stretch=True)
+            self.move_to((lower_left + upper_right) / 2)
+
+
+class BifurcationDiagramCloud(DotCloud):
+    """Point cloud of a bifurcation diagram (see get_bifurcation_diagram), with the parameter
+    on the horizontal axis and a coordinate of the recorded states on the vertical one.
+    If axes are given (e.g. Axes or a NumberPlane), points are placed on them."""
+
+    def __init__(
+        self,
+        diagram: BifurcationDiagram,
+        axes=None,
+        coordinate=0,
+        color=BASE_STYLE.color,
+        radius=DS_BIFURCATION_DIAGRAM_DOT_RADIUS,
+        **kwargs
+    ):
+        self.diagram = diagram
+        values = diagram.get_points(coordinate)
+        if axes is None:
+            points = np.hstack([values, np.zeros((len(values), 1))])
+        else:
+            # Axes are linear, so every point is placed at once from where the unit vectors go
+            origin = axes.c2p(0, 0)
+            points = origin + values[:, :1] * (axes.c2p(1, 0) - origin) + values[:, 1:] * (axes.c2p(0, 1) - origin)
+        super().__init__(points, color=color, radius=radius, **kwargs)
+
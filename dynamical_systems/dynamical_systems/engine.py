@@ -0,0 +1,319 @@
+import numpy as np
+import math
+
+from dynamical_systems.constants import *
+from dynamical_systems.vector_fields import SystemVectorField, TimeDirectedVectorField
+from dynamical_systems.solvers import get_solver
+from dynamical_systems.ensemble import DynamicalSystemEnsemble
+from dynamical_systems.progress import ProgressReporter
+
+
+
+class Trajectory:
+    """Result of integrating a system from an initial position: the positions it went
+    through (an array of shape (n_of_points, dimension)), the field at each of them,
+    the times at which they were reached, and the events found along the way.
+
+    Events are given as functions that take an array of states and return a value for
+    each. An event happens whenever its value changes sign (or only when it goes up or
+    down, if given as an (event, direction) pair, see find_events), and event_points[i]
+    and event_times[i] hold where and when the i-th event happened."""
+
+    def __init__(self, points, derivatives, times, events=None):
+        self.points = points
+        self.derivatives = derivatives
+        self.times = times
+
+        self.event_points = []
+        self.event_times = []
+        for event in events or []:
+            points, times = find_events(*_get_event_and_direction(event), self.points, self.times, self.derivatives)
+            self.event_points.append(points)
+            self.event_times.append(times)
+
+    def __len__(self):
+        return len(self.points)
+
+    def get_speeds(self):
+        return np.linalg.norm(self.derivatives, axis=1)
+
+
+class TrajectoryPlayback:
+    """Integrates a system ahead of time, with a fixed time_delta, and then plays the
+    trajectory back at whatever pace it's asked to. Positions between the precomputed
+    ones are interpolated, so playing it back costs the same for any system, and the
+    result doesn't depend on the frame rate.
+
+    The trajectory is integrated in pieces of duration seconds (of playback, that is,
+    before applying speed_rate), and extended with another one when it runs out."""
+
+    def __init__(self, vector_field, initial_position, duration, time_delta=DEFAULT_TIME_DELTA, speed_rate=1, **integration_settings):
+        self.vector_field = get_vector_field(vector_field)
+        self.duration = duration
+        self.time_delta = time_delta
+        self.speed_rate = speed_rate
+        self.integration_settings = integration_settings
+
+        self.points = np.array([initial_position], dtype=float)[:, :self.vector_field.dimension]
+        self.derivatives = self.vector_field(self.points)
+        self.times = np.zeros(1)
+        self.time = 0 # Time of the system (i.e. after applying speed_rate) played back so far
+        self._extend()
+
+    def advance(self, dt):
+        """Moves playback forward by dt. Returns the positions the system went through
+        since the last call (ending on its current position) and the field at each."""
+
+        previous_time = self.time
+        self.time += dt * self.speed_rate
+        while self.time > self.times[-1]:
+            self._extend(previous_time)
+
+        start = np.searchsorted(self.times, previous_time, side='right')
+        end = np.searchsorted(self.times, self.time, side='right')
+        points = self.points[start:end]
+        derivatives = self.derivatives[start:end]
+
+        if self.times[end - 1] < self.time:
+            point, derivative = self.get_position_at(self.time)
+            points = np.vstack([points, point])
+            derivatives = np.vstack([derivatives, derivative])
+
+        return points, derivatives
+
+    def get_position_at(self, time):
+        """Returns the position of the system at the given (already integrated) time and
+        the field there, interpolated from the precomputed positions around it."""
+
+        i = min(max(np.searchsorted(self.times, time, side='right') - 1, 0), len(self.times) - 2)
+        h = self.times[i + 1] - self.times[i]
+        fraction = (time - self.times[i]) / h
+        point = hermite_interpolate(
+            self.points[i], self.points[i + 1], self.derivatives[i], self.derivatives[i + 1], h, fraction
+        )
+        derivative = self.derivatives[i] + fraction * (self.derivatives[i + 1] - self.derivatives[i])
+        return point, derivative
+
+    def _extend(self, played_time=0):
+        """Integrates another piece of the trajectory from its last position,
+        dropping the positions played before played_time."""
+
+        first_kept = max(np.searchsorted(self.times, played_time, side='right') - 1, 0)
+        n_of_iterations = max(1, math.ceil(self.duration * self.speed_rate / self.time_delta))
+        trajectory = integrate_trajectory(
+            self.vector_field, self.points[-1], n_of_iterations, self.time_delta, **self.integration_settings
+        )
+        self.points = np.concatenate([self.points[first_kept:], trajectory.points[1:]])
+        self.derivatives = np.concatenate([self.derivatives[first_kept:], trajectory.derivatives[1:]])
+        self.times = np.concatenate([self.times[first_kept:], self.times[-1] + trajectory.times[1:]])
+
+
+def hermite_interpolate(p0, p1, d0, d1, h, fraction):
+    """Cubic Hermite interpolation between positions p0 and p1, a time h apart,
+    where the field is d0 and d1, at the given fraction (between 0 and 1) of the way."""
+
+    fraction = np.asarray(fraction, dtype=float)[..., None] if np.ndim(fraction) else fraction
+    f2 = fraction**2
+    f3 = fraction**3
+    return (
+        (2*f3 - 3*f2 + 1) * p0
+        + (f3 - 2*f2 + fraction) * h * d0
+        + (-2*f3 + 3*f2) * p1
+        + (f3 - f2) * h * d1
+    )
+
+
+def get_vector_field(vector_field) -> SystemVectorField:
+    """Takes a SystemVectorField or a list with the system functions (dx, dy and maybe dz)."""
+
+    return vector_field if isinstance(vector_field, SystemVectorField) else SystemVectorField(vector_field)
+
+
+def integrate_trajectories(
+    vector_field,
+    initial_positions,
+    n_of_iterations,
+    time_delta=DEFAULT_TIME_DELTA,
+    events=None,
+    progress: ProgressReporter=None, # Updated with the steps of every system
+    **integration_settings # See DynamicalSystemEnsemble, e.g. solver or speed_rate
+):
+    """Integrates the system from each initial position n_of_iterations times,
+    all of them together, and returns a Trajectory for each.
+
+    Works with NumPy arrays only, so it can be used without manimlib (e.g. to
+    precompute trajectories in batch jobs). Time runs backwards if time_delta is negative."""
+
+    ensemble = DynamicalSystemEnsemble(initial_positions, get_vector_field(vector_field), **integration_settings)
+    points, derivatives, times = ensemble.integrate(n_of_iterations, time_delta, with_derivatives=True, with_times=True, progress=progress)
+    return _get_trajectories(points, derivatives, times, events)
+
+
+def integrate_trajectory(vector_field, initial_position, n_of_iterations, time_delta=DEFAULT_TIME_DELTA, events=None, progress=None, **integration_settings):
+    """Integrates the system from an initial position n_of_iterations times, see integrate_trajectories."""
+
+    return integrate_trajectories(vector_field, [initial_position], n_of_iterations, time_delta, events, progress, **integration_settings)[0]
+
+
+def stream_trajectories(
+    vector_field,
+    initial_positions,
+    chunk_size=DS_TRAJECTORY_CHUNK_SIZE,
+    time_delta=DEFAULT_TIME_DELTA,
+    n_of_chunks=None,
+    events=None,
+    **integration_settings
+):
+    """Integrates the system from each initial position chunk_size steps at a time, and
+    yields a list with a Trajectory for each system after every chunk, forever (or
+    n_of_chunks times). Only one chunk is held at a time, so consumers that keep what
+    they need (e.g. with a TrajectoryHistory) run in constant memory.
+
+    Each chunk starts with the position the previous one ended on (so that events
+    between chunks aren't missed), and its times continue from the previous one's."""
+
+    ensemble = DynamicalSystemEnsemble(initial_positions, get_vector_field(vector_field), **integration_settings)
+    start_time = 0
+    chunk_index = 0
+    while n_of_chunks is None or chunk_index < n_of_chunks:
+        points, derivatives, times = ensemble.integrate(chunk_size, time_delta, with_derivatives=True, with_times=True)
+        yield _get_trajectories(points, derivatives, [start_time + t for t in times], events)
+        start_time += chunk_size * time_delta * ensemble.speed_rate
+        chunk_index += 1
+
+
+def stream_trajectory(vector_field, initial_position, chunk_size=DS_TRAJECTORY_CHUNK_SIZE, time_delta=DEFAULT_TIME_DELTA, n_of_chunks=None, events=None, **integration_settings):
+    """Yields a Trajectory for each chunk of the solution through an initial position, see stream_trajectories."""
+
+    for trajectories in stream_trajectories(vector_field, [initial_position], chunk_size, time_delta, n_of_chunks, events, **integration_settings):
+        yield trajectories[0]
+
+
+def integrate_snapshot(vector_field, initial_position, time_domain=DS_SNAPSHOT_DEFAULT_TIME_DOMAIN, time_delta=DEFAULT_TIME_DELTA, events=None, **integration_settings):
+    """Integrates the two pieces of a snapshot (the solution through a point over
+    a time domain) like DynamicalSystemSnapshot does, that is, back in time over
+    abs(time_domain[0]) and forward over time_domain[1], in steps of time_delta.
+    Returns the backward and forward trajectories, both starting from the initial position."""
+
+    return tuple(
+        integrate_trajectory(
+            vector_field,
+            initial_position,
+            math.floor(abs(time_domain[is_forward]) / time_delta),
+            time_delta if is_forward else -time_delta,
+            events,
+            **integration_settings
+        ) for is_forward in [False, True]
+    )
+
+
+def integrate_bilateral_trajectories(vector_field, initial_positions, time_domain, time_delta=DEFAULT_TIME_DELTA, solver=None):
+    """Integrates the solution through each initial position over a time domain (containing t=0),
+    backward and forward in time, all of them together as a single batch (see TimeDirectedVectorField).
+    Returns two arrays of shape (n_of_systems, n_of_positions, dimension), with the positions of the
+    backward and forward pieces of each solution, both starting from the initial positions."""
+
+    vector_field = get_vector_field(vector_field)
+    solver = get_solver(solver)
+    initial_positions = np.asarray(initial_positions, dtype=float)
+    n_of_systems = len(initial_positions)
+    n_of_iterations = [math.floor(abs(time) / time_delta) for time in time_domain]
+
+    # Backward pieces go first, and both pieces take as many steps as the longest one
+    field = TimeDirectedVectorField(vector_field, np.repeat([-1, 1], n_of_systems))
+    points = np.empty((max(n_of_iterations) + 1, 2 * n_of_systems, vector_field.dimension))
+    points[0] = np.concatenate([initial_positions, initial_positions])
+    for i in range(1, len(points)):
+        points[i] = solver.step(field, points[i - 1], time_delta)
+
+    return (
+        np.swapaxes(points[:n_of_iterations[0] + 1, :n_of_systems], 0, 1),
+        np.swapaxes(points[:n_of_iterations[1] + 1, n_of_systems:], 0, 1),
+    )
+
+
+def find_events(event, points, times, derivatives=None, direction=0):
+    """Returns the points and times at which the values of the event function change
+    sign along a trajectory, going up if direction is 1, down if it's -1, or either way if 0.
+
+    Each event is located between the consecutive positions it happens between. If the
+    field at those positions is given, the trajectory is approximated there with a cubic
+    Hermite curve and the event is refined on it (which is as accurate as the solver, for
+    solvers up to fourth order), otherwise it's linearly interpolated."""
+
+    return find_events_in_trajectories(event, [Trajectory(points, derivatives, times)], direction)[0]
+
+
+def find_events_in_trajectories(event, trajectories, direction=0):
+    """Finds the events of the event function along each trajectory like find_events does,
+    evaluating it on every trajectory at once. Returns an (event_points, event_times) pair
+    for each trajectory."""
+
+    lengths = [len(trajectory) for trajectory in trajectories]
+    points = np.concatenate([trajectory.points for trajectory in trajectories])
+    times = np.concatenate([trajectory.times for trajectory in trajectories])
+    has_derivatives = all(trajectory.derivatives is not None for trajectory in trajectories)
+    derivatives = np.concatenate([trajectory.derivatives for trajectory in trajectories]) if has_derivatives else None
+
+    values = np.asarray(event(points), dtype=float)
+    # Positions right on the event count once, as the end of a crossing
+    crossings = np.flatnonzero(
+        ((values[:-1] < 0) & (values[1:] >= 0) & (direction >= 0))
+        | ((values[:-1] > 0) & (values[1:] <= 0) & (direction <= 0))
+    )
+    # The last position of a trajectory and the first of the next one aren't consecutive
+    ends = np.cumsum(lengths)
+    crossings = crossings[~np.isin(crossings + 1, ends)]
+
+    event_points, event_times = _locate_events(event, points, times, derivatives, values, crossings)
+    split_indices = np.searchsorted(crossings, ends[:-1])
+    return list(zip(np.split(event_points, split_indices), np.split(event_times, split_indices)))
+
+
+def _locate_events(event, points, times, derivatives, values, crossings):
+    """Returns where and when the events between each crossing position and the next one happen."""
+
+    v0, v1 = values[crossings], values[crossings + 1]
+    t0, h = times[crossings], times[crossings + 1] - times[crossings]
+    fractions = v0 / (v0 - v1)
+    if derivatives is None:
+        event_points = points[crossings] + fractions[:, None] * (points[crossings + 1] - points[crossings])
+        return event_points, t0 + fractions * h
+
+    def get_points(fractions):
+        return hermite_interpolate(
+            points[crossings], points[crossings + 1], derivatives[crossings], derivatives[crossings + 1], h[:, None], fractions
+        )
+
+    # Regula falsi on the Hermite curve, keeping the event between lower and upper
+    # (and halving the value at an end kept twice in a row, so that both ends move)
+    lower, upper = np.zeros(len(crossings)), np.ones(len(crossings))
+    lower_values, upper_values = v0, v1
+    last_moved = np.zeros(len(crossings))
+    for _ in range(DS_EVENT_REFINEMENT_ITERATIONS if len(crossings) > 0 else 0):
+        new_values = np.asarray(event(get_points(fractions)), dtype=float)
+        moves_lower = np.sign(new_values) == np.sign(lower_values)
+        upper_values = np.where(moves_lower & (last_moved < 0), upper_values / 2, upper_values)
+        lower_values = np.where(~moves_lower & (last_moved > 0), lower_values / 2, lower_values)
+        lower, lower_values = np.where(moves_lower, fractions, lower), np.where(moves_lower, new_values, lower_values)
+        upper, upper_values = np.where(moves_lower, upper, fractions), np.where(moves_lower, upper_values, new_values)
+        last_moved = np.where(moves_lower, -1, 1)
+        fractions = (lower * upper_values - upper * lower_values) / (upper_values - lower_values)
+
+    return get_points(fractions), t0 + fractions * h
+
+
+def _get_trajectories(points, derivatives, times, events):
+    """Returns a Trajectory for each system, finding their events all at once."""
+
+    trajectories = [Trajectory(*values) for values in zip(points, derivatives, times)]
+    for event in events or []:
+        event, direction = _get_event_and_direction(event)
+        for trajectory, (event_points, event_times) in zip(trajectories, find_events_in_trajectories(event, trajectories, direction)):
+            trajectory.event_points.append(event_points)
+            trajectory.event_times.append(event_times)
+    return trajectories
+
+
+def _get_event_and_direction(event):
+    return event if isinstance(event, tuple) else (event, 0)
@@ -0,0 +1,155 @@
+import numpy as np
+
+from dynamical_systems.vector_fields import SystemVectorField, TimeDirectedVectorField
+from dynamical_systems.solvers import get_solver
+from dynamical_systems.profiling import profile_stage
+from dynamical_systems.progress import ProgressReporter
+
+
+
+class DynamicalSystemEnsemble:
+    """Holds the states of many systems of the same equations in a single
+    (n_of_systems, dimension) array and advances all of them together, so
+    each stage of the solver evaluates the field once for the whole batch.
+
+    Systems can move backward in time (or stay put) too, see time_directions."""
+
+    def __init__(
+        self,
+        initial_positions,
+        vector_field: SystemVectorField,
+        speed_rate=1,
+        precision_multiplier_if_trace_too_rough=1,
+        trace_precision_increase_threshold=np.inf,
+        solver=None, # See solvers.SOLVERS
+        time_directions=None, # Direction in time each system moves in (1 forward, -1 backward, 0 not at all), all forward if None
+    ):
+        self.vector_field = vector_field
+        self.time_directions = None if time_directions is None else np.array(time_directions, dtype=float)
+        self.solver = get_solver(solver)
+        self.initial_states = np.array(
+            [list(pos)[:vector_field.dimension] for pos in initial_positions], dtype=float
+        )
+        self.speed_rate = speed_rate
+        self.precision_multiplier_if_trace_too_rough = precision_multiplier_if_trace_too_rough
+        self.trace_precision_increase_threshold = trace_precision_increase_threshold
+        self.reset()
+
+    def __len__(self):
+        return len(self.states)
+
+    def reset(self):
+        """Moves every system back to its initial position."""
+
+        self.states = self.initial_states.copy()
+        self.previous_states = self.initial_states.copy()
+        # Results of the last step, see step()
+        self.substates = None
+        self.refined = np.zeros(len(self.states), dtype=bool)
+        self.derivatives = None # Field at the current states, see get_derivatives()
+
+    def get_vector_field(self, systems=slice(None)):
+        """Returns the field the given systems (all of them by default) move along,
+        which is reversed for the ones moving backward in time (see TimeDirectedVectorField)."""
+
+        if self.time_directions is None:
+            return self.vector_field
+        return TimeDirectedVectorField(self.vector_field, self.time_directions[systems])
+
+    def set_time_direction(self, system, direction):
+        """Sets the direction in time the system in the given index moves in from now on (see time_directions)."""
+
+        if self.time_directions is None:
+            self.time_directions = np.ones(len(self.states))
+        self.time_directions[system] = direction
+        self.derivatives = None
+
+    def get_derivatives(self):
+        """Returns the field the systems move along at the current states.
+        It's evaluated once per step and reused by the solver to take the next one."""
+
+        if self.derivatives is None:
+            self.derivatives = self.get_vector_field()(self.states)
+        return self.derivatives
+
+    def step(self, dt):
+        """Advances every system by dt.
+
+        Returns an array of shape (precision_multiplier, n_of_systems, dimension) with
+        the intermediate positions of each system, and a boolean mask with the systems
+        whose step was too long and was therefore split into smaller ones. For systems
+        that weren't refined, only the last intermediate position is meaningful."""
+
+        with profile_stage('ensemble_step', n_of_items=len(self.states)):
+            dt = dt * self.speed_rate
+            mult = self.precision_multiplier_if_trace_too_rough
+            previous_states = self.states
+            derivatives = self.derivatives
+            next_states = self.solver.step(self.get_vector_field(), previous_states, dt, derivatives)
+
+            substates = np.broadcast_to(next_states, (mult, *next_states.shape)).copy()
+            refined = np.zeros(len(next_states), dtype=bool)
+            if mult > 1:
+                refined = np.linalg.norm(next_states - previous_states, axis=1) > self.trace_precision_increase_threshold
+                if refined.any():
+                    with profile_stage('refinement', n_of_items=mult * int(refined.sum())):
+                        current = previous_states[refined]
+                        current_derivatives = None if derivatives is None else derivatives[refined]
+                        refined_vector_field = self.get_vector_field(refined)
+                        for k in range(mult):
+                            current = self.solver.step(refined_vector_field, current, dt / mult, current_derivatives)
+                            current_derivatives = None
+                            substates[k, refined] = current
+
+        self.previous_states = previous_states
+        self.states = substates[-1]
+        self.substates = substates
+        self.refined = refined
+        self.derivatives = None
+        return substates, refined
+
+    def integrate(self, n_of_iterations, dt, with_derivatives=False, with_times=False, progress: ProgressReporter=None):
+        """Steps every system n_of_iterations times from its current position.
+
+        Returns a list with one array per system, holding all the positions
+        it went through (starting from the current one). If with_derivatives is True,
+        also returns a list with the field at each of those positions, most of which
+        are evaluated anyway to take the steps. If with_times is True, also returns
+        a list with the time (since the current one) at which each position is reached.
+        The steps of every system are added to progress, if given."""
+
+        mult = self.precision_multiplier_if_trace_too_rough
+        n_of_systems, dimension = self.states.shape
+        points = np.empty((n_of_iterations + 1, mult, n_of_systems, dimension))
+        is_point = np.zeros((n_of_iterations + 1, mult, n_of_systems), dtype=bool)
+
+        points[0, -1] = self.states
+        is_point[0, -1] = True
+        if with_derivatives:
+            derivatives = np.empty_like(points)
+        for i in range(1, n_of_iterations + 1):
+            if with_derivatives:
+                derivatives[i - 1, -1] = self.get_derivatives()
+            points[i], refined = self.step(dt)
+            is_point[i, :-1] = refined
+            is_point[i, -1] = True
+            if progress is not None:
+                progress.update(n_of_systems)
+
+        results = [points.reshape(-1, n_of_systems, dimension)]
+        if with_derivatives:
+            derivatives[-1, -1] = self.get_derivatives()
+            is_substate = is_point[:, :-1]
+            if is_substate.any():
+                # Systems are the last axis, so the last indices of the substates tell which system each is of
+                substate_systems = np.nonzero(is_substate)[-1]
+                derivatives[:, :-1][is_substate] = self.get_vector_field(substate_systems)(points[:, :-1][is_substate])
+            results.append(derivatives.reshape(-1, n_of_systems, dimension))
+        if with_times:
+            # Substeps of refined steps are reached at fractions of dt
+            times = (np.arange(n_of_iterations + 1)[:, None] - 1 + np.arange(1, mult + 1) / mult) * dt * self.speed_rate
+            results.append(np.broadcast_to(times[:, :, None], is_point.shape).reshape(-1, n_of_systems))
+
+        is_point = is_point.reshape(-1, n_of_systems)
+        results = [[values[is_point[:, i], i] for i in range(n_of_systems)] for values in results]
+        return results[0] if len(results) == 1 else tuple(results)
@@ -13,6 +13,15 @@ class RangeType(StrEnum):
     ASSYMETRIC = auto()
 
 
+def _get_scaled_vector_field(scene):
+    """Returns the scaled vector field of the system of an ExpandedScene or ExpandedThreeDScene,
+    compiling the scaling into the field itself when it's symbolic."""
+
+    if scene.vector_field is not None:
+        return scene.vector_field.scaled(scene.scale_factor) if scene.scale_factor != 1 else scene.vector_field
+    return SystemVectorField(scene._get_scaled_system_functions())
+
+
 class ExpandedScene(Scene):
     snapshot_time_domain = [0, 100]
     
@@ -20,6 +29,7 @@ class ExpandedScene(Scene):
 
     dx = None # To define in construct() method in subclass
     dy = None # To define in construct() method in subclass
+    vector_field = None # Can be defined instead of dx and dy (see compile_vector_field)
     scale_factor = 1
 
     speed_rate = 1 # Larger speed rate results in less smoothness
@@ -133,12 +143,10 @@ class ExpandedScene(Scene):
         assert self.initial_positions is not None, "Should set initial positions before calling this method"
         assert is_for_n_positions <= len(self.initial_positions), "Number of positions requested exceedes total number of positions"
         
-        scaled_functions = self._get_scaled_system_functions()
         params = dict(
             scene=self,
             initial_positions=list(self.initial_positions)[:is_for_n_positions] if is_for_n_positions else self.initial_positions,
-            dx = scaled_functions[0],
-            dy = scaled_functions[1],
+            vector_field = _get_scaled_vector_field(self),
             speed_rate = self.speed_rate,
             width = self.width,
             stroke_opacity = self.stroke_opacity,
@@ -186,6 +194,7 @@ class ExpandedThreeDScene(ThreeDScene):
     dx = None # To define in construct() method in subclass
     dy = None # To define in construct() method in subclass
     dz = None # To define in construct() method in subclass
+    vector_field = None # Can be defined instead of dx, dy and dz (see compile_vector_field)
     scale_factor = 1
 
     speed_rate = 1 # Larger speed rate results in less smoothness
@@ -352,13 +361,10 @@ class ExpandedThreeDScene(ThreeDScene):
         assert self.initial_positions is not None, "Should set initial positions before calling this method"
         assert is_for_n_positions <= len(self.initial_positions), "Number of positions requested exceedes total number of positions"
         
-        scaled_functions = self._get_scaled_system_functions()
         params = dict(
             scene=self,
             initial_positions=list(self.initial_positions)[:is_for_n_positions] if is_for_n_positions else self.initial_positions,
-            dx = scaled_functions[0],
-            dy = scaled_functions[1],
-            dz = scaled_functions[2],
+            vector_field = _get_scaled_vector_field(self),
             speed_rate = self.speed_rate,
             width = self.width,
             stroke_opacity = self.stroke_opacity,
@@ -0,0 +1,103 @@
+import numpy as np
+import math
+
+from dynamical_systems.constants import *
+
+
+
+class TraceFadeOutBuffer:
+    """Keeps track of which segments of a fading trace are faded out, and for how long.
+
+    Segment lengths are stored in a fixed-capacity ring buffer along with a running sum
+    of them, so adding a segment costs the same no matter how long the trace is. The most
+    recent segments (up to amount_to_not_fade_out_trace_before in length and
+    max_number_of_trace_lines in number) are not faded out. Older ones fade out as they age:
+    their opacity decreases linearly by trace_fadeout_decrease_factor and their width
+    geometrically by the same factor on every new segment, until they're removed.
+
+    Segments are indexed by the order in which they were added. The buffers are twice
+    the capacity, with every value written twice, so that the live segments can always
+    be read as a contiguous slice."""
+
+    def __init__(
+        self,
+        amount_to_not_fade_out_trace_before,
+        max_number_of_trace_lines,
+        trace_fadeout_decrease_factor,
+        segments_per_step=1,
+    ):
+        self.amount_to_not_fade_out_trace_before = amount_to_not_fade_out_trace_before
+        self.max_number_of_trace_lines = max_number_of_trace_lines
+        self.trace_fadeout_decrease_factor = trace_fadeout_decrease_factor
+
+        # Number of new segments it takes for a segment to fade out completely
+        self.fade_out_duration = math.ceil(1 / trace_fadeout_decrease_factor)
+        self.capacity = max_number_of_trace_lines + DS_FADE_OUT_BUFFER_SLACK * segments_per_step * self.fade_out_duration
+
+        self._lengths = np.zeros(2 * self.capacity)
+        # Sum of the lengths of all segments up to (and including) each one
+        self._cumulative_lengths = np.zeros(2 * self.capacity)
+        # Number of segments that had been added when each segment started fading out
+        self._fade_out_starts = np.zeros(2 * self.capacity, dtype=np.int64)
+
+        self.n_of_segments_added = 0
+        self.total_length = 0.0
+        self.first_segment = 0 # Oldest segment still in the trace
+        self.first_segment_not_to_fade_out = 0
+
+    def get_n_of_segments(self):
+        return self.n_of_segments_added - self.first_segment
+
+    def add_segment(self, length):
+        """Adds a segment at the end of the trace and returns the number of segments
+        that should be removed from its start, because they're completely faded out."""
+
+        index = self.n_of_segments_added
+        self.total_length += length
+        self._write(self._lengths, index, length)
+        self._write(self._cumulative_lengths, index, self.total_length)
+        self.n_of_segments_added += 1
+
+        # Segments that leave the part of the trace not to fade out start fading out now
+        while self.first_segment_not_to_fade_out < index and self._should_fade_out(self.first_segment_not_to_fade_out):
+            self._write(self._fade_out_starts, self.first_segment_not_to_fade_out, self.n_of_segments_added)
+            self.first_segment_not_to_fade_out += 1
+
+        previous_first_segment = self.first_segment
+        while self.first_segment < self.first_segment_not_to_fade_out and (
+            self._get_age(self.first_segment) >= self.fade_out_duration
+            or self.get_n_of_segments() > self.capacity
+        ):
+            self.first_segment += 1
+
+        return self.first_segment - previous_first_segment
+
+    def get_fade_out_factors(self):
+        """Returns the factors by which to multiply the opacity and width
+        of each segment in the trace, oldest first."""
+
+        ages = self.n_of_segments_added - self._read(self._fade_out_starts)
+        ages[self.first_segment_not_to_fade_out - self.first_segment:] = 0
+
+        opacity_factors = np.clip(1 - self.trace_fadeout_decrease_factor * ages, 0, 1)
+        width_factors = (1 - self.trace_fadeout_decrease_factor)**ages
+        return opacity_factors, width_factors
+
+    def _should_fade_out(self, index):
+        n_of_newer_segments = self.n_of_segments_added - index
+        length_up_to_the_end = self.total_length - (self._cumulative_lengths[index % self.capacity] - self._lengths[index % self.capacity])
+        return n_of_newer_segments > self.max_number_of_trace_lines or length_up_to_the_end > self.amount_to_not_fade_out_trace_before
+
+    def _get_age(self, index):
+        return self.n_of_segments_added - self._fade_out_starts[index % self.capacity]
+
+    def _write(self, buffer, index, value):
+        position = index % self.capacity
+        buffer[position] = value
+        buffer[position + self.capacity] = value
+
+    def _read(self, buffer):
+        """Returns the values of every segment in the trace, oldest first."""
+
+        start = self.first_segment % self.capacity
+        return buffer[start:start + self.get_n_of_segments()]
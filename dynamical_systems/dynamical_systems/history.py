@@ -0,0 +1,179 @@
+import numpy as np
+
+from dynamical_systems.constants import *
+
+
+
+class TrajectoryHistory:
+    """Base class for the policies deciding which of the positions a system goes
+    through are kept. Positions are added in blocks (arrays of shape (n_of_points,
+    dimension)) and are indexed by the order in which they were added, whether they
+    are still kept or not."""
+
+    name = None
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.n_of_points_added = 0
+
+    def add(self, points):
+        """Adds a block of positions, the most recent last."""
+
+        raise NotImplementedError("Need to implement add in a subclass.")
+
+    def get_points(self):
+        """Returns the positions kept, oldest first."""
+
+        raise NotImplementedError("Need to implement get_points in a subclass.")
+
+    def get_point(self, index):
+        """Returns the position added in the given place (negative indices count
+        from the last one). If it isn't kept, returns the closest earlier position
+        that is, or the oldest one kept."""
+
+        raise NotImplementedError("Need to implement get_point in a subclass.")
+
+    def get_last_point(self):
+        return self.get_point(-1)
+
+    def _get_absolute_index(self, index):
+        return index + self.n_of_points_added if index < 0 else index
+
+    def __len__(self):
+        return len(self.get_points())
+
+
+
+class KeepAllHistory(TrajectoryHistory):
+    """Keeps every position, in an array that doubles its size when full."""
+
+    name = 'all'
+
+    def __init__(self, dimension):
+        super().__init__(dimension)
+        self._points = np.empty((DS_TRACE_INITIAL_CAPACITY, dimension))
+
+    def add(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, self.dimension)
+        end = self.n_of_points_added + len(points)
+        if end > len(self._points):
+            grown = np.empty((max(end, 2 * len(self._points)), self.dimension))
+            grown[:self.n_of_points_added] = self._points[:self.n_of_points_added]
+            self._points = grown
+        self._points[self.n_of_points_added:end] = points
+        self.n_of_points_added = end
+
+    def get_points(self):
+        return self._points[:self.n_of_points_added]
+
+    def get_point(self, index):
+        index = self._get_absolute_index(index)
+        return self._points[min(max(index, 0), self.n_of_points_added - 1)]
+
+
+
+class KeepLastHistory(TrajectoryHistory):
+    """Keeps the last max_n_of_points positions in a ring buffer, written twice
+    so that they can always be read as a contiguous slice."""
+
+    name = 'last'
+
+    def __init__(self, dimension, max_n_of_points=DS_HISTORY_DEFAULT_MAX_N_OF_POINTS):
+        super().__init__(dimension)
+        self.max_n_of_points = max_n_of_points
+        self._points = np.empty((2 * max_n_of_points, dimension))
+
+    def add(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, self.dimension)
+        n_of_new_points = len(points)
+        # Older positions of a long block would be overwritten right away
+        points = points[-self.max_n_of_points:]
+        first_index = self.n_of_points_added + n_of_new_points - len(points)
+        positions = (first_index + np.arange(len(points))) % self.max_n_of_points
+        self._points[positions] = points
+        self._points[positions + self.max_n_of_points] = points
+        self.n_of_points_added += n_of_new_points
+
+    def get_points(self):
+        n_of_points_kept = min(self.n_of_points_added, self.max_n_of_points)
+        start = (self.n_of_points_added - n_of_points_kept) % self.max_n_of_points
+        return self._points[start:start + n_of_points_kept]
+
+    def get_point(self, index):
+        index = self._get_absolute_index(index)
+        index = min(max(index, self.n_of_points_added - self.max_n_of_points, 0), self.n_of_points_added - 1)
+        return self._points[index % self.max_n_of_points]
+
+
+
+class KeepDecimatedHistory(TrajectoryHistory):
+    """Keeps at most max_n_of_points positions evenly spread over the whole trajectory:
+    every position while there's room, and then every other one of those, every fourth,
+    and so on, as the trajectory gets longer. The last position is always kept too."""
+
+    name = 'decimated'
+
+    def __init__(self, dimension, max_n_of_points=DS_HISTORY_DEFAULT_MAX_N_OF_POINTS):
+        super().__init__(dimension)
+        self.max_n_of_points = max(2, max_n_of_points)
+        self.stride = 1 # Positions kept are the ones whose index is a multiple of the stride
+        self._points = np.empty((self.max_n_of_points, dimension))
+        self._n_of_points_kept = 0
+        self._last_point = None
+
+    def add(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, self.dimension)
+        if len(points) == 0:
+            return
+
+        indices = self.n_of_points_added + np.arange(len(points))
+        self.n_of_points_added += len(points)
+        self._last_point = points[-1].copy()
+
+        is_kept = indices % self.stride == 0
+        points, indices = points[is_kept], indices[is_kept]
+        while self._n_of_points_kept + len(points) > self.max_n_of_points:
+            # Keep every other position, both of the ones kept and of the new ones
+            kept = self._points[:self._n_of_points_kept:2].copy()
+            self._n_of_points_kept = len(kept)
+            self._points[:self._n_of_points_kept] = kept
+            self.stride *= 2
+            is_kept = indices % self.stride == 0
+            points, indices = points[is_kept], indices[is_kept]
+
+        self._points[self._n_of_points_kept:self._n_of_points_kept + len(points)] = points
+        self._n_of_points_kept += len(points)
+
+    def get_points(self):
+        points = self._points[:self._n_of_points_kept]
+        if self._last_point is not None and (self.n_of_points_added - 1) % self.stride != 0:
+            return np.vstack([points, self._last_point])
+        return points
+
+    def get_point(self, index):
+        index = self._get_absolute_index(index)
+        if index >= self.n_of_points_added - 1:
+            return self._last_point
+        return self._points[min(max(index, 0) // self.stride, self._n_of_points_kept - 1)]
+
+
+
+HISTORIES = {
+    history.name: history for history in [KeepAllHistory, KeepLastHistory, KeepDecimatedHistory]
+}
+
+
+def get_trajectory_history(history, dimension) -> TrajectoryHistory:
+    """Takes the value of the trajectory_history style attribute and returns the
+    corresponding TrajectoryHistory for a system of the given dimension. It can be
+    a TrajectoryHistory, the name of one (see HISTORIES) or a (name, max_n_of_points)
+    pair, e.g. ('last', 1000). None keeps every position."""
+
+    if history is None:
+        history = DS_DEFAULT_TRAJECTORY_HISTORY
+    if isinstance(history, TrajectoryHistory):
+        return history
+    name, *args = [history] if isinstance(history, str) else history
+    if name not in HISTORIES:
+        raise Exception(f"Unsupported trajectory history: {name}. Should be one of {list(HISTORIES)}")
+    return HISTORIES[name](dimension, *args)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from dynamical_systems.constants import *
+from dynamical_systems.solvers import get_solver
+from dynamical_systems.engine import get_vector_field
+from dynamical_systems.progress import ProgressReporter
+
+
+
+def get_jacobians(vector_field, states, step=DS_JACOBIAN_FINITE_DIFFERENCE_STEP):
+    """Returns the Jacobian matrix of the field at each state, in an array of shape
+    (n_of_states, dimension, dimension). Fields that can compute it (e.g. compiled
+    with compile_vector_field) do so, and others are approximated with central
+    differences, evaluating the field on every perturbed state at once."""
+
+    vector_field = get_vector_field(vector_field)
+    states = np.asarray(states, dtype=float)
+    if hasattr(vector_field, 'jacobian'):
+        return vector_field.jacobian(states)
+
+    n_of_states, dimension = states.shape
+    steps = step * np.maximum(1, np.abs(states))
+    # Shape (2, n_of_states, perturbed axis, dimension): states moved forward and backward along each axis
+    offsets = steps[:, :, None] * np.eye(dimension)
+    perturbed_states = states[None, :, None, :] + np.array([1, -1])[:, None, None, None] * offsets
+    derivatives = vector_field(perturbed_states.reshape(-1, dimension)).reshape(perturbed_states.shape)
+    # Entry (i, j) is the derivative of component i along axis j
+    return np.swapaxes((derivatives[0] - derivatives[1]) / (2 * steps[:, :, None]), 1, 2)
+
+
+def get_divergences(vector_field, states):
+    """Returns the divergence of the field (the trace of its Jacobian) at each state,
+    that is, how fast volumes of the phase space grow (or shrink if negative) around it."""
+
+    return np.trace(get_jacobians(vector_field, states), axis1=1, axis2=2)
+
+
+def get_lyapunov_spectra(
+    vector_field,
+    initial_positions,
+    n_of_iterations,
+    time_delta=DEFAULT_TIME_DELTA,
+    n_of_exponents=None, # All of them if None
+    n_of_transient_iterations=0, # Steps taken before measuring, so that systems reach their attractor
+    orthonormalization_interval=DS_LYAPUNOV_ORTHONORMALIZATION_INTERVAL,
+    solver=DS_LYAPUNOV_DEFAULT_SOLVER,
+    progress: ProgressReporter=None, # Updated with the steps of every system
+):
+    """Estimates the largest n_of_exponents Lyapunov exponents of the system around the
+    trajectory through each initial position, all of them together. Returns an array
+    of shape (n_of_systems, n_of_exponents), with the exponents of each system from largest
+    to smallest. A positive largest exponent means the trajectory is chaotic.
+
+    Each system is integrated along with n_of_exponents tangent vectors, which evolve with
+    the Jacobian of the field. Every orthonormalization_interval steps they're re-orthonormalized
+    (with a QR decomposition of all of them at once), and the exponents are the average
+    rates at which they grew in between."""
+
+    vector_field = get_vector_field(vector_field)
+    solver = get_solver(solver)
+    states = np.array(initial_positions, dtype=float)
+    n_of_systems, dimension = states.shape
+    n_of_exponents = n_of_exponents or dimension
+    assert 0 < n_of_exponents <= dimension, f"Can't estimate more than {dimension} exponents"
+
+    for _ in range(n_of_transient_iterations):
+        states = solver.step(vector_field, states, time_delta)
+        if progress is not None:
+            progress.update(n_of_systems)
+
+    def tangent_field(augmented_states):
+        states = augmented_states[:, :dimension]
+        tangents = augmented_states[:, dimension:].reshape(-1, dimension, n_of_exponents)
+        return np.concatenate([
+            vector_field(states),
+            (get_jacobians(vector_field, states) @ tangents).reshape(len(states), -1)
+        ], axis=1)
+
+    tangents = np.broadcast_to(np.eye(dimension)[:, :n_of_exponents], (n_of_systems, dimension, n_of_exponents))
+    augmented_states = np.concatenate([states, tangents.reshape(n_of_systems, -1)], axis=1)
+    log_growths = np.zeros((n_of_systems, n_of_exponents))
+
+    for i in range(1, n_of_iterations + 1):
+        augmented_states = solver.step(tangent_field, augmented_states, time_delta)
+        if i % orthonormalization_interval == 0 or i == n_of_iterations:
+            tangents, growths = np.linalg.qr(augmented_states[:, dimension:].reshape(-1, dimension, n_of_exponents))
+            log_growths += np.log(np.abs(np.diagonal(growths, axis1=1, axis2=2)))
+            augmented_states[:, dimension:] = tangents.reshape(n_of_systems, -1)
+        if progress is not None:
+            progress.update(n_of_systems)
+
+    return log_growths / (n_of_iterations * time_delta)
+
+
+def get_lyapunov_spectrum(vector_field, initial_position, n_of_iterations, time_delta=DEFAULT_TIME_DELTA, **kwargs):
+    """Estimates the Lyapunov exponents around the trajectory through an initial position, see get_lyapunov_spectra."""
+
+    return get_lyapunov_spectra(vector_field, [initial_position], n_of_iterations, time_delta, **kwargs)[0]
+
+
+def get_max_lyapunov_exponents(vector_field, initial_positions, n_of_iterations, time_delta=DEFAULT_TIME_DELTA, **kwargs):
+    """Estimates the largest Lyapunov exponent around the trajectory through each initial position
+    (tracking a single tangent vector, so it's faster than getting the whole spectrum)."""
+
+    return get_lyapunov_spectra(vector_field, initial_positions, n_of_iterations, time_delta, n_of_exponents=1, **kwargs)[:, 0]
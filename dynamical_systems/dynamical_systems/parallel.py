@@ -0,0 +1,96 @@
+import math
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dynamical_systems.ensemble import DynamicalSystemEnsemble
+from dynamical_systems.progress import ProgressReporter
+
+
+
+# Function the worker processes are running (see run_in_parallel). Workers are
+# forked, so they inherit it instead of getting it pickled (which wouldn't work with
+# the lambdas systems are usually defined with).
+_shared_function = None
+
+
+def run_in_parallel(function, n_of_tasks, n_of_workers=None, on_task_done=None):
+    """Calls function with the index of each task in a pool of n_of_workers processes
+    (one per CPU if None), and returns the results in the order of the tasks. If given,
+    on_task_done is called here with the index of each task as it's done.
+
+    If there's a single worker or task, or processes can't be forked on this platform,
+    every task is run here, one after the other."""
+
+    n_of_workers = n_of_workers or os.cpu_count() or 1
+    if n_of_workers == 1 or n_of_tasks <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        results = []
+        for task_index in range(n_of_tasks):
+            results.append(function(task_index))
+            if on_task_done is not None:
+                on_task_done(task_index)
+        return results
+
+    global _shared_function
+    _shared_function = function
+    try:
+        with ProcessPoolExecutor(max_workers=min(n_of_workers, n_of_tasks), mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = {executor.submit(_run_task, task_index): task_index for task_index in range(n_of_tasks)}
+            for future in as_completed(futures):
+                if on_task_done is not None:
+                    on_task_done(futures[future])
+            return [future.result() for future in futures]
+    finally:
+        _shared_function = None
+
+
+def _run_task(task_index):
+    return _shared_function(task_index)
+
+
+def integrate_in_parallel(ensemble: DynamicalSystemEnsemble, n_of_iterations, dt, n_of_workers=None, progress: ProgressReporter=None):
+    """Integrates every system of the ensemble from its initial position, like
+    ensemble.integrate does, but splitting the systems in chunks that a pool of
+    n_of_workers processes (one per CPU if None) integrate at the same time.
+
+    Results are in the same order as the systems of the ensemble. If there's a single
+    worker, or processes can't be forked on this platform, everything is integrated here.
+    The steps of every system are added to progress, if given, as each chunk is done."""
+
+    n_of_workers = n_of_workers or os.cpu_count() or 1
+    n_of_systems = len(ensemble.initial_states)
+    # Every system takes as many steps, so one chunk per worker keeps them equally busy,
+    # while integrating as many systems together as possible
+    chunk_size = math.ceil(n_of_systems / n_of_workers)
+    chunks = [(start, min(start + chunk_size, n_of_systems)) for start in range(0, n_of_systems, chunk_size)]
+
+    if n_of_workers == 1 or len(chunks) == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        ensemble.reset()
+        return ensemble.integrate(n_of_iterations, dt, progress=progress)
+
+    def on_chunk_done(chunk_index):
+        if progress is not None:
+            start, end = chunks[chunk_index]
+            progress.update((end - start) * n_of_iterations)
+
+    results = run_in_parallel(
+        lambda chunk_index: _integrate_chunk(ensemble, chunks[chunk_index], n_of_iterations, dt),
+        len(chunks),
+        n_of_workers,
+        on_chunk_done
+    )
+    return [points for chunk_points in results for points in chunk_points]
+
+
+def _integrate_chunk(ensemble, chunk, n_of_iterations, dt):
+    start, end = chunk
+    ensemble = DynamicalSystemEnsemble(
+        initial_positions=ensemble.initial_states[start:end],
+        vector_field=ensemble.vector_field,
+        speed_rate=ensemble.speed_rate,
+        precision_multiplier_if_trace_too_rough=ensemble.precision_multiplier_if_trace_too_rough,
+        trace_precision_increase_threshold=ensemble.trace_precision_increase_threshold,
+        solver=ensemble.solver,
+        time_directions=None if ensemble.time_directions is None else ensemble.time_directions[start:end],
+    )
+    return ensemble.integrate(n_of_iterations, dt)
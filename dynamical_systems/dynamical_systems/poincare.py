@@ -0,0 +1,73 @@
+import numpy as np
+import math
+
+from dynamical_systems.constants import *
+from dynamical_systems.ensemble import DynamicalSystemEnsemble
+from dynamical_systems.engine import Trajectory, get_vector_field, find_events_in_trajectories
+from dynamical_systems.progress import ProgressReporter
+
+
+
+def get_plane_section(normal, point=None):
+    """Returns an event function (see find_events) whose value is the signed distance of
+    each state to the plane (or hyperplane) through point perpendicular to normal.
+    Crossing it going up means moving in the direction of normal."""
+
+    normal = np.asarray(normal, dtype=float)
+    normal = normal / np.linalg.norm(normal)
+    offset = 0 if point is None else normal @ np.asarray(point, dtype=float)
+    return lambda states: states @ normal - offset
+
+
+def get_poincare_sections(
+    vector_field,
+    initial_positions,
+    section,
+    n_of_iterations,
+    time_delta=DEFAULT_TIME_DELTA,
+    direction=1, # Crossings going up (1), down (-1) or both (0), see find_events
+    n_of_transient_iterations=0, # Steps taken before looking for crossings, so that systems reach their attractor
+    chunk_size=DS_TRAJECTORY_CHUNK_SIZE,
+    progress: ProgressReporter=None, # Updated with the steps of every system
+    **integration_settings # See DynamicalSystemEnsemble, e.g. solver
+):
+    """Integrates the system from each initial position n_of_iterations times, all of them
+    together, and returns where and when each trajectory crosses the section (an event function,
+    e.g. get_plane_section) in the given direction, as an (event_points, event_times) pair for
+    each system. Times are counted from the end of the transient.
+
+    Trajectories are integrated chunk_size steps at a time and only their crossings are kept,
+    so it runs in constant memory for any number of iterations."""
+
+    ensemble = DynamicalSystemEnsemble(initial_positions, get_vector_field(vector_field), **integration_settings)
+    n_of_systems = len(ensemble.states)
+    for _ in range(n_of_transient_iterations):
+        ensemble.step(time_delta)
+        if progress is not None:
+            progress.update(n_of_systems)
+
+    crossings = [[] for _ in range(n_of_systems)]
+    start_time = 0
+    for chunk_index in range(math.ceil(n_of_iterations / chunk_size)):
+        n_of_chunk_iterations = min(chunk_size, n_of_iterations - chunk_index * chunk_size)
+        points, derivatives, times = ensemble.integrate(
+            n_of_chunk_iterations, time_delta, with_derivatives=True, with_times=True, progress=progress
+        )
+        trajectories = [Trajectory(p, d, start_time + t) for p, d, t in zip(points, derivatives, times)]
+        for system_crossings, chunk_crossings in zip(crossings, find_events_in_trajectories(section, trajectories, direction)):
+            system_crossings.append(chunk_crossings)
+        start_time += n_of_chunk_iterations * time_delta * ensemble.speed_rate
+
+    dimension = ensemble.states.shape[1]
+    return [
+        (
+            np.concatenate([p for p, t in system_crossings] or [np.empty((0, dimension))]),
+            np.concatenate([t for p, t in system_crossings] or [np.empty(0)]),
+        ) for system_crossings in crossings
+    ]
+
+
+def get_poincare_section(vector_field, initial_position, section, n_of_iterations, time_delta=DEFAULT_TIME_DELTA, **kwargs):
+    """Returns where and when the trajectory through an initial position crosses the section, see get_poincare_sections."""
+
+    return get_poincare_sections(vector_field, [initial_position], section, n_of_iterations, time_delta, **kwargs)[0]
@@ -0,0 +1,145 @@
+import time
+import contextlib
+
+
+
+class StageStats:
+    """Time spent on a stage, number of times it ran and number of items
+    it handled (e.g. states evaluated or corners added)."""
+
+    def __init__(self):
+        self.n_of_calls = 0
+        self.time = 0.0
+        self.n_of_items = 0
+
+    def add(self, elapsed, n_of_calls=1, n_of_items=0):
+        self.n_of_calls += n_of_calls
+        self.time += elapsed
+        self.n_of_items += n_of_items
+
+    def as_dict(self):
+        return dict(n_of_calls=self.n_of_calls, time=self.time, n_of_items=self.n_of_items)
+
+
+
+class Profiler:
+    """Records the time and calls of each stage of the systems while it's active (see
+    profile), per system and in total. Stages are:
+        'integration': stepping systems (including the stages below it)
+        'vector_field': evaluating the field, with the number of states as items
+        'refinement': splitting steps that were too long into substeps (see
+                      trace_precision_increase_threshold), with the substeps as items
+        'ensemble_step': stepping a DynamicalSystemEnsemble, with its systems as items
+        'trace_update': adding corners to traces, with their number as items
+        'color_lookup': coloring trace corners by velocity, with their number as items
+        'fade_out': keeping track of and applying the fading of traces
+    Work done in other processes (see integrate_in_parallel) isn't recorded.
+    Stages can run inside others (e.g. vector_field inside integration), and time
+    is counted in each of them.
+
+    The callback, if given, is called with the system (or None), the stage, the time
+    it took and the number of items on each record."""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stats = {} # System name -> stage -> StageStats
+        self._system_names = {} # id(system) -> name
+
+    def record(self, system, stage, elapsed, n_of_calls=1, n_of_items=0):
+        system_stats = self.stats.setdefault(self.get_system_name(system), {})
+        system_stats.setdefault(stage, StageStats()).add(elapsed, n_of_calls, n_of_items)
+        if self.callback is not None:
+            self.callback(system, stage, elapsed, n_of_items)
+
+    def get_system_name(self, system):
+        """Systems are named after their class and the order in which they were first
+        recorded (e.g. 'DynamicalSystem 3'). Work not done by a system goes to 'scene'."""
+
+        if system is None:
+            return 'scene'
+        key = id(system)
+        if key not in self._system_names:
+            self._system_names[key] = f"{type(system).__name__} {len(self._system_names)}"
+        return self._system_names[key]
+
+    def get_totals(self):
+        """Returns the stats of each stage added up over every system."""
+
+        totals = {}
+        for system_stats in self.stats.values():
+            for stage, stats in system_stats.items():
+                totals.setdefault(stage, StageStats()).add(stats.time, stats.n_of_calls, stats.n_of_items)
+        return totals
+
+    def as_dict(self):
+        return dict(
+            totals={stage: stats.as_dict() for stage, stats in self.get_totals().items()},
+            systems={
+                name: {stage: stats.as_dict() for stage, stats in system_stats.items()}
+                for name, system_stats in self.stats.items()
+            },
+        )
+
+    def get_report(self):
+        """Returns a table with the totals of each stage, slowest first."""
+
+        lines = [f"{'stage':<16}{'calls':>10}{'items':>12}{'time (s)':>12}"]
+        for stage, stats in sorted(self.get_totals().items(), key=lambda item: -item[1].time):
+            lines.append(f"{stage:<16}{stats.n_of_calls:>10}{stats.n_of_items:>12}{stats.time:>12.4f}")
+        return '\n'.join(lines)
+
+
+
+# Profilers recording right now, and systems whose stages are running (innermost last)
+_active_profilers = []
+_running_systems = []
+
+_NOT_PROFILING = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def profile(profiler: Profiler=None, callback=None):
+    """Records the stages that run inside the block, e.g.
+
+        with profile() as profiler:
+            scene.wait(5)
+        print(profiler.get_report())
+
+    Nothing is recorded (and stages cost next to nothing) outside of it."""
+
+    profiler = profiler or Profiler(callback)
+    _active_profilers.append(profiler)
+    try:
+        yield profiler
+    finally:
+        _active_profilers.remove(profiler)
+
+
+def profile_stage(stage, system=None, n_of_items=0):
+    """Returns a context manager recording the time of a stage of the given system
+    (or of the system whose stage it runs inside of) in the active profilers."""
+
+    if not _active_profilers:
+        return _NOT_PROFILING
+    return _StageTimer(stage, system, n_of_items)
+
+
+class _StageTimer:
+    def __init__(self, stage, system, n_of_items):
+        self.stage = stage
+        self.system = system
+        self.n_of_items = n_of_items
+
+    def __enter__(self):
+        if self.system is None and _running_systems:
+            self.system = _running_systems[-1]
+        _running_systems.append(self.system)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        _running_systems.pop()
+        for profiler in _active_profilers:
+            profiler.record(self.system, self.stage, elapsed, n_of_items=self.n_of_items)
+        return False
@@ -0,0 +1,105 @@
+import logging
+import time
+
+from dynamical_systems.constants import *
+
+
+
+class ProgressReporter:
+    """Keeps count of the work done in a build (e.g. steps integrated or systems
+    built) and reports it at most once every interval seconds, along with how fast
+    it's going and how long is left, so that hot loops can update it on every iteration.
+    Builds that end before the first report aren't reported at all.
+
+    Reports go to the callback, which takes the reporter (see get_message). Without
+    a callback, work is only counted. A reporter can be shared, e.g. by the workers
+    of a pool or the systems of a family, to report their work as a whole."""
+
+    def __init__(self, description, total, unit='steps', callback=None, interval=DS_PROGRESS_REPORT_INTERVAL):
+        self.description = description
+        self.total = total
+        self.unit = unit
+        self.callback = callback
+        self.interval = interval
+
+        self.n_done = 0
+        self.is_done = False
+        self.n_of_reports = 0
+        self.start_time = time.perf_counter()
+        self._last_report_time = self.start_time
+
+    def update(self, n=1):
+        self.n_done += n
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        if now - self._last_report_time >= self.interval:
+            self._last_report_time = now
+            self._report()
+
+    def close(self):
+        """Marks the build as done, reporting it if it was reported before."""
+
+        if self.is_done:
+            return
+        self.is_done = True
+        if self.callback is not None and self.n_of_reports > 0:
+            self._report()
+
+    def get_elapsed_time(self):
+        return time.perf_counter() - self.start_time
+
+    def get_rate(self):
+        """Returns the units of work done per second so far."""
+
+        elapsed_time = self.get_elapsed_time()
+        return self.n_done / elapsed_time if elapsed_time > 0 else 0.0
+
+    def get_eta(self):
+        """Returns the estimated number of seconds left, or None if it can't be estimated yet."""
+
+        rate = self.get_rate()
+        return max(self.total - self.n_done, 0) / rate if rate > 0 else None
+
+    def get_message(self):
+        rate = self.get_rate()
+        if self.is_done:
+            return f"{self.description}: done, {self.n_done} {self.unit} in {self.get_elapsed_time():.1f}s ({rate:.0f} {self.unit}/s)"
+        percentage = 100 * self.n_done / self.total if self.total else 100
+        eta = self.get_eta()
+        return (
+            f"{self.description}: {self.n_done}/{self.total} {self.unit} ({percentage:.0f}%), "
+            f"{rate:.0f} {self.unit}/s, ETA {'?' if eta is None else f'{eta:.0f}s'}"
+        )
+
+    def _report(self):
+        self.n_of_reports += 1
+        self.callback(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+
+def log_progress(reporter: ProgressReporter):
+    logging.getLogger(DS_PROGRESS_LOGGER_NAME).info(reporter.get_message())
+
+
+def get_progress_reporter(progress, description, total, unit='steps') -> ProgressReporter:
+    """Takes the value of the progress style attribute and returns a ProgressReporter
+    for a build. It can be 'log' (report to the DS_PROGRESS_LOGGER_NAME logger), a function
+    taking the reporter or False (don't report). None reports as DS_DEFAULT_PROGRESS does."""
+
+    if progress is None:
+        progress = DS_DEFAULT_PROGRESS
+    if progress is False:
+        return ProgressReporter(description, total, unit)
+    if progress == 'log':
+        return ProgressReporter(description, total, unit, log_progress)
+    if callable(progress):
+        return ProgressReporter(description, total, unit, progress)
+    raise Exception(f"Unsupported progress: {progress}. Should be 'log', a function or False")
@@ -0,0 +1,224 @@
+import numpy as np
+
+from dynamical_systems.constants import *
+
+
+
+class Solver:
+    """Base class for the numerical methods used to integrate systems.
+
+    A solver advances a batch of states, an array of shape (n_of_states, dimension),
+    by a time step dt, using a vector field that takes and returns arrays of that shape.
+    If the derivatives at the states are already known (e.g. from color coding them),
+    they can be passed to step to save an evaluation of the field."""
+
+    name = None
+
+    def step(self, vector_field, states, dt, derivatives=None):
+        raise NotImplementedError("Need to implement step in a subclass.")
+
+    def reset(self):
+        """Forgets what the solver kept from previous steps, if anything, so that
+        integrations starting after this don't depend on earlier ones."""
+
+        pass
+
+    def get_definition(self):
+        """Returns the name and settings of the solver (but not its state)."""
+
+        return dict(name=self.name)
+
+    def __str__(self):
+        return self.name
+
+
+
+class EulerSolver(Solver):
+    """Explicit (forward) Euler method. One evaluation of the field per step."""
+
+    name = 'euler'
+
+    def step(self, vector_field, states, dt, derivatives=None):
+        return states + dt * (vector_field(states) if derivatives is None else derivatives)
+
+
+
+class RK4Solver(Solver):
+    """Classic fourth order Runge-Kutta method. Four evaluations of the field per step."""
+
+    name = 'rk4'
+
+    def step(self, vector_field, states, dt, derivatives=None):
+        k1 = vector_field(states) if derivatives is None else derivatives
+        k2 = vector_field(states + dt/2 * k1)
+        k3 = vector_field(states + dt/2 * k2)
+        k4 = vector_field(states + dt * k3)
+        return states + dt/6 * (k1 + 2*k2 + 2*k3 + k4)
+
+
+
+class DormandPrinceSolver(Solver):
+    """Adaptive Runge-Kutta 5(4) method of Dormand and Prince.
+
+    Each step of length dt is covered with as many internal steps as the error
+    tolerances require, so dt can be way larger than with fixed step methods.
+    The error of a batch is measured over all of its states at once, and the last
+    accepted internal step size is kept to start off the next call (until reset).
+    Results therefore depend slightly on which states are integrated together, within
+    the tolerances, e.g. cached trajectories of families integrated by a different
+    number of workers."""
+
+    name = 'rk45'
+
+    A = [
+        [],
+        [1/5],
+        [3/40, 9/40],
+        [44/45, -56/15, 32/9],
+        [19372/6561, -25360/2187, 64448/6561, -212/729],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+    ]
+    # Difference between the fifth and fourth order weights, used to estimate the error
+    E = [71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40]
+
+    def __init__(
+        self,
+        rtol=DS_SOLVER_DEFAULT_RTOL,
+        atol=DS_SOLVER_DEFAULT_ATOL,
+        max_internal_steps=DS_SOLVER_MAX_INTERNAL_STEPS
+    ):
+        self.rtol = rtol
+        self.atol = atol
+        self.max_internal_steps = max_internal_steps
+        self.internal_step = None
+
+    def reset(self):
+        self.internal_step = None
+
+    def step(self, vector_field, states, dt, derivatives=None):
+        if dt == 0:
+            return states
+
+        direction = np.sign(dt)
+        remaining = abs(dt)
+        h = remaining if self.internal_step is None else self.internal_step
+
+        k1 = vector_field(states) if derivatives is None else derivatives
+        for _ in range(self.max_internal_steps):
+            step_size = min(h, remaining)
+            new_states, new_k1, error = self._attempt_step(vector_field, states, k1, direction * step_size)
+
+            scale = self.atol + self.rtol * np.maximum(np.abs(states), np.abs(new_states))
+            error_norm = np.sqrt(np.mean((error / scale)**2)) if error.size else 0.0
+
+            if error_norm <= 1 or step_size <= DS_SOLVER_MIN_INTERNAL_STEP:
+                states, k1 = new_states, new_k1
+                remaining -= step_size
+                if remaining <= DS_SOLVER_MIN_INTERNAL_STEP:
+                    break
+
+            factor = 5 if error_norm == 0 else min(5, max(0.2, 0.9 * error_norm**-0.2))
+            h = max(step_size * factor, DS_SOLVER_MIN_INTERNAL_STEP)
+        else:
+            raise Exception(
+                f"Took {self.max_internal_steps} internal steps without covering dt={dt} ({remaining} left). "
+                "Increase max_internal_steps or the tolerances, or take shorter steps"
+            )
+
+        self.internal_step = h
+        return states
+
+    def get_definition(self):
+        return dict(name=self.name, rtol=self.rtol, atol=self.atol, max_internal_steps=self.max_internal_steps)
+
+    def _attempt_step(self, vector_field, states, k1, h):
+        k = [k1]
+        for i in range(1, 7):
+            stage_states = states + h * sum(a * k_j for a, k_j in zip(self.A[i], k) if a != 0)
+            k.append(vector_field(stage_states))
+
+        # The seventh stage is evaluated on the new states (first same as last)
+        new_states = stage_states
+        error = h * sum(e * k_j for e, k_j in zip(self.E, k) if e != 0)
+        return new_states, k[6], error
+
+
+
+class LeapfrogSolver(Solver):
+    """Symplectic leapfrog (Stormer-Verlet) method.
+
+    Assumes that the first half of the coordinates are positions and the second half
+    their velocities, as in x' = y, y' = f(x, y) for a pendulum. For mechanical
+    systems without friction it preserves energy over long times.
+
+    The field evaluated for the last half kick of a step is kept (until reset) for the
+    first half kick of the next one, if it starts where that step ended, so each step
+    evaluates the field twice."""
+
+    name = 'leapfrog'
+
+    def __init__(self):
+        # (vector field, states, field evaluated for their last half kick) of the last step
+        self._last_step = None
+
+    def reset(self):
+        self._last_step = None
+
+    def step(self, vector_field, states, dt, derivatives=None):
+        half = states.shape[1] // 2
+        assert 2 * half == states.shape[1], "The leapfrog solver needs systems with an even number of coordinates"
+
+        if derivatives is None:
+            derivatives = self._get_last_derivatives(vector_field, states)
+            if derivatives is None:
+                derivatives = vector_field(states)
+
+        half_kicked = states.copy()
+        half_kicked[:, half:] += dt/2 * derivatives[:, half:]
+
+        drifted = half_kicked.copy()
+        drifted[:, :half] += dt * vector_field(half_kicked)[:, :half]
+
+        last_derivatives = vector_field(drifted)
+        drifted[:, half:] += dt/2 * last_derivatives[:, half:]
+        self._last_step = (vector_field, drifted.copy(), last_derivatives)
+        return drifted
+
+    def _get_last_derivatives(self, vector_field, states):
+        if self._last_step is None:
+            return None
+        last_vector_field, last_states, last_derivatives = self._last_step
+        if last_vector_field is vector_field and np.array_equal(last_states, states):
+            return last_derivatives
+        return None
+
+
+
+class MapSolver(Solver):
+    """Iterates the field as a map: each step goes to the value of the field at the
+    current states, whatever dt is. For discrete systems, like the logistic map."""
+
+    name = 'map'
+
+    def step(self, vector_field, states, dt, derivatives=None):
+        return vector_field(states) if derivatives is None else derivatives
+
+
+
+SOLVERS = {
+    solver.name: solver for solver in [EulerSolver, RK4Solver, DormandPrinceSolver, LeapfrogSolver, MapSolver]
+}
+
+
+def get_solver(solver=None) -> Solver:
+    """Takes a solver name (see SOLVERS), a Solver object or None (for the
+    default solver) and returns a Solver object."""
+
+    if solver is None:
+        solver = DS_DEFAULT_SOLVER
+    if isinstance(solver, Solver):
+        return solver
+    if solver not in SOLVERS:
+        raise Exception(f"Unsupported solver: {solver}. Should be one of {list(SOLVERS)}")
+    return SOLVERS[solver]()
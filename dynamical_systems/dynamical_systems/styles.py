@@ -24,7 +24,15 @@ class DynamicalSystemStyle:
         'line_trace_overlap_buff',
         'max_number_of_trace_lines',
         'precision_multiplier_if_trace_too_rough',
-        'trace_precision_increase_threshold'
+        'trace_precision_increase_threshold',
+        'solver',
+        'time_delta',
+        'trajectory_cache',
+        'color_coding_grid_range',
+        'color_coding_grid_resolution',
+        'trajectory_history',
+        'trace_decimation_tolerance',
+        'progress',
     ]
 
     def __init__(self, **kwargs):
@@ -75,12 +83,33 @@ BASE_STYLE = DynamicalSystemStyle(
     velocity_colors= [(GREEN, 0), (YELLOW, 5), (RED, 10)], # Each number represents at least how big the derivative must be to color the curve that way
     trace_fadeout_decrease_factor = 0.05,
     amount_to_not_fade_out_trace_before = 5,
-    line_trace_overlap_buff=EXP_SCENE_DEFAULT_TRACE_OVERLAP_BUFF,
+    line_trace_overlap_buff=EXP_SCENE_DEFAULT_TRACE_OVERLAP_BUFF, # Unused since color-coded traces are a single VMobject
     max_number_of_trace_lines=500,
     # [int] How many times to split dt in a single frame to add more steps to the approximation.
     # Increase to add detail and preserve speed rate, or if there is a large variation in speed in the system.
     precision_multiplier_if_trace_too_rough=1,
     trace_precision_increase_threshold=0.15,
+    # Numerical method used to integrate the system (see solvers.SOLVERS) - 'euler', 'rk4', 'rk45', 'leapfrog' or 'map'
+    solver=DS_DEFAULT_SOLVER,
+    # Time step used when building snapshots. Higher order solvers can take larger steps.
+    time_delta=DEFAULT_TIME_DELTA,
+    # Where to cache snapshot trajectories between renders - None (don't cache), True (default directory),
+    # a directory or a TrajectoryCache. Entries follow the values system functions read from trackers
+    # (get_value), but not other state read through methods, which can result in stale trajectories
+    trajectory_cache=None,
+    # Bounds (on every axis) and number of points per axis of the grid where the system is evaluated
+    # to get the color coding limit, when color coding 'from_plane'
+    color_coding_grid_range=[-DS_PLANE_COLOR_CODING_VALUES_RANGE, DS_PLANE_COLOR_CODING_VALUES_RANGE],
+    color_coding_grid_resolution=DS_PLANE_COLOR_CODING_GRID_RESOLUTION,
+    # Positions of real-time systems to keep (see history.HISTORIES) - 'all', ('last', n) or ('decimated', n)
+    trajectory_history=DS_DEFAULT_TRAJECTORY_HISTORY,
+    # How far (in scene units) snapshot traces can be from the integrated trajectory when dropping points
+    # that don't change their shape (see decimation.py). 0 keeps every point; about 0.0025 is a third of a
+    # pixel at 1080p with the default frame, and usually removes most points of straight stretches.
+    trace_decimation_tolerance=0,
+    # How to report the progress of long builds (see progress.get_progress_reporter) - 'log',
+    # a function taking a ProgressReporter, or False
+    progress=DS_DEFAULT_PROGRESS,
 )
 
 PHASE_PLANE_STYLE = DynamicalSystemStyle.from_existing_style(
@@ -0,0 +1,99 @@
+import numpy as np
+
+from dynamical_systems.vector_fields import SystemVectorField
+from dynamical_systems.profiling import profile_stage
+
+
+
+DEFAULT_VARIABLE_NAMES = ['x', 'y', 'z']
+
+
+class SymbolicVectorField(SystemVectorField):
+    """Vector field defined by SymPy expressions (or strings), compiled into a single
+    vectorized NumPy kernel that evaluates every component at once. The Jacobian
+    of the field is compiled the same way the first time it's needed.
+
+    Parameters (a dict of names and values, like the ones in attractor_descriptions.py)
+    are replaced by their values before compiling."""
+
+    def __init__(self, expressions, parameters=None, variables=None):
+        import sympy
+
+        parameters = parameters or dict()
+        variables = variables or DEFAULT_VARIABLE_NAMES[:len(expressions)]
+        self.variables = [sympy.Symbol(v) if isinstance(v, str) else v for v in variables]
+
+        # Names such as beta, gamma or S would otherwise be parsed as SymPy objects
+        symbols = {str(name): sympy.Symbol(str(name)) for name in parameters}
+        symbols.update({v.name: v for v in self.variables})
+        values = {symbols[str(name)]: sympy.sympify(value) for name, value in parameters.items()}
+
+        self.parameters = {str(name): value for name, value in parameters.items()}
+        self.expressions = [
+            sympy.sympify(expression, locals=symbols).subs(values) for expression in expressions
+        ]
+        assert len(self.expressions) == len(self.variables), "Should give one expression per variable"
+
+        self.kernel = sympy.lambdify(self.variables, self.expressions, modules='numpy', cse=True)
+        self._jacobian_kernel = None
+
+        # Component functions, for the parts of the library that evaluate one coordinate at a time
+        super().__init__([
+            sympy.lambdify(self.variables, expression, modules='numpy') for expression in self.expressions
+        ])
+
+    def __call__(self, states):
+        states = np.asarray(states, dtype=float)
+        with profile_stage('vector_field', n_of_items=len(states)):
+            derivatives = np.empty((len(states), self.dimension))
+            for axis, component in enumerate(self.kernel(*states.T)):
+                derivatives[:, axis] = component
+        return derivatives
+
+    def jacobian(self, states):
+        """Returns the Jacobian matrix of the field at each state,
+        in an array of shape (n_of_states, dimension, dimension)."""
+
+        if self._jacobian_kernel is None:
+            import sympy
+            matrix = sympy.Matrix(self.expressions).jacobian(self.variables)
+            self._jacobian_kernel = sympy.lambdify(self.variables, matrix.tolist(), modules='numpy', cse=True)
+
+        states = np.asarray(states, dtype=float)
+        jacobians = np.empty((len(states), self.dimension, self.dimension))
+        for i, row in enumerate(self._jacobian_kernel(*states.T)):
+            for j, entry in enumerate(row):
+                jacobians[:, i, j] = entry
+        return jacobians
+
+    def get_definition(self):
+        return dict(
+            expressions=[str(e) for e in self.expressions],
+            variables=[str(v) for v in self.variables]
+        )
+
+    def scaled(self, scale_factor):
+        """Returns the field of the system scaled by scale_factor, that is,
+        scale_factor * f(v / scale_factor). Larger scale_factor results in larger system."""
+
+        substitutions = {v: v / scale_factor for v in self.variables}
+        return SymbolicVectorField(
+            [scale_factor * e.subs(substitutions, simultaneous=True) for e in self.expressions],
+            variables=self.variables
+        )
+
+    def __str__(self):
+        return str(self.expressions)
+
+
+def compile_vector_field(expressions, parameters=None, variables=None) -> SymbolicVectorField:
+    """Compiles the given expressions (SymPy expressions or strings, one per coordinate)
+    into a vector field that can be passed to systems instead of dx, dy and dz.
+
+    Example:
+        compile_vector_field(
+            ['sigma * (y - x)', 'rho * x - y - x * z', 'x * y - beta * z'],
+            parameters=dict(sigma=10, beta='8/3', rho=28)
+        )"""
+
+    return SymbolicVectorField(expressions, parameters, variables)
@@ -0,0 +1,169 @@
+import numpy as np
+import hashlib
+import inspect
+import os
+import types
+
+from dynamical_systems.constants import *
+
+
+
+class TrajectoryCache:
+    """Content-addressed cache of integrated trajectories, stored as .npz files
+    in a local directory. Entries are keyed by a hash of the system definition
+    (its vector field, see describe_value) and of the integration settings, so
+    changing any of them results in a new entry instead of a stale one.
+
+    Keys include the settings of the solver but not its state: solvers are reset before
+    cached integrations. Adaptive solvers ('rk45') measure their error over every system
+    integrated together, so entries of families integrated by a different number of workers
+    are equivalent within the solver tolerances, rather than identical.
+
+    The hash follows the code, constants and closures of the system functions, and the
+    values of trackers they read (e.g. parameter.get_value() with a ValueTracker), but
+    can't see through everything (e.g. other state read through methods, or values read
+    from a file), so clear the directory if results look outdated."""
+
+    def __init__(self, directory=DS_TRAJECTORY_CACHE_DEFAULT_DIRECTORY):
+        self.directory = directory
+
+    def get_key(self, **definition):
+        """Returns the key of an entry, given everything that determines its contents."""
+
+        description = describe_value(dict(version=DS_TRAJECTORY_CACHE_VERSION, **definition))
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key):
+        """Returns a dict with the arrays stored under key, or None if there's no such entry."""
+
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            # Unreadable entries (e.g. from an interrupted write) are just recomputed
+            return None
+
+    def save(self, key, **arrays):
+        """Stores the given arrays under key."""
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(key)
+        # Write to a temporary file first so readers never see half-written entries
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(temporary_path, path)
+
+    def clear(self):
+        """Removes every entry of the cache."""
+
+        if os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, filename))
+
+
+def get_trajectory_cache(cache) -> TrajectoryCache:
+    """Takes the value of the trajectory_cache style attribute (None or False for
+    no cache, True for the default directory, a directory or a TrajectoryCache)
+    and returns the corresponding TrajectoryCache, or None."""
+
+    if cache is None or cache is False:
+        return None
+    if isinstance(cache, TrajectoryCache):
+        return cache
+    if cache is True:
+        return TrajectoryCache()
+    return TrajectoryCache(cache)
+
+
+def describe_value(value, names=None, depth=0):
+    """Returns a deterministic string describing a value, to be hashed.
+
+    Functions are described by their code, constants and the values they reference
+    (closures and globals), recursively. Arbitrary objects are described by their type
+    and by the attributes the referencing code uses (names), and trackers whose value
+    it gets (e.g. a ValueTracker or DecimalNumber) by their value too."""
+
+    if depth > DS_TRAJECTORY_CACHE_MAX_DESCRIPTION_DEPTH:
+        return type(value).__qualname__
+
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return repr(value)
+    if isinstance(value, np.generic):
+        return repr(value.item())
+    if isinstance(value, np.ndarray):
+        return f"ndarray({value.dtype}, {value.shape}, {hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()})"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(describe_value(v, names, depth + 1) for v in value)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(describe_value(v, names, depth + 1) for v in value) + "]"
+    if isinstance(value, dict):
+        return "{" + ", ".join(
+            f"{describe_value(k, names, depth + 1)}: {describe_value(v, names, depth + 1)}"
+            for k, v in sorted(value.items(), key=lambda item: repr(item[0]))
+        ) + "}"
+    if isinstance(value, types.ModuleType):
+        return f"module({value.__name__})"
+    if isinstance(value, types.BuiltinFunctionType) or inspect.isclass(value):
+        return f"{getattr(value, '__module__', '')}.{value.__qualname__}"
+    if isinstance(value, types.CodeType):
+        return _describe_code(value, depth)
+    if isinstance(value, types.MethodType):
+        return "method(" + describe_value(value.__func__, names, depth + 1) + ", " + describe_value(
+            value.__self__, value.__func__.__code__.co_names, depth + 1
+        ) + ")"
+    if isinstance(value, types.FunctionType):
+        return _describe_function(value, depth)
+    if hasattr(value, 'get_definition'):
+        return describe_value(value.get_definition(), names, depth + 1)
+
+    attributes = {
+        name: getattr(value, name) for name in sorted(names or [])
+        if name in getattr(value, '__dict__', {})
+    }
+    # Trackers keep their value in data the code doesn't name
+    if names and 'get_value' in names and callable(getattr(value, 'get_value', None)):
+        attributes['get_value()'] = value.get_value()
+    return f"{type(value).__qualname__}(" + describe_value(attributes, names, depth + 1) + ")"
+
+
+def _describe_code(code, depth):
+    return "code(" + ", ".join([
+        code.co_code.hex(),
+        describe_value(code.co_consts, None, depth + 1),
+        describe_value(code.co_names, None, depth + 1),
+    ]) + ")"
+
+
+def _describe_function(function, depth):
+    code = function.__code__
+    names = _get_referenced_names(code)
+    closure = [
+        describe_value(cell.cell_contents, names, depth + 1) for cell in (function.__closure__ or [])
+    ]
+    referenced_globals = {
+        name: function.__globals__[name] for name in code.co_names if name in function.__globals__
+    }
+    return "function(" + ", ".join([
+        _describe_code(code, depth),
+        describe_value(function.__defaults__, names, depth + 1),
+        "[" + ", ".join(closure) + "]",
+        describe_value(referenced_globals, names, depth + 1),
+    ]) + ")"
+
+
+def _get_referenced_names(code):
+    """Returns the global and attribute names used by a code object and its nested ones."""
+
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            names |= _get_referenced_names(constant)
+    return names
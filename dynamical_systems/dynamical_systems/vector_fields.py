@@ -0,0 +1,95 @@
+import numpy as np
+
+from dynamical_systems.profiling import profile_stage
+
+
+
+class SystemVectorField:
+    """Bundles the component functions of a system (dx, dy and maybe dz) into
+    a single callable that evaluates the whole field on a batch of states."""
+
+    def __init__(self, functions):
+        self.functions = [f for f in functions if f is not None]
+        self.dimension = len(self.functions)
+
+        # Functions built with math.* or that branch on their arguments
+        # can't take arrays, so they get evaluated point by point
+        self.is_vectorized = True
+
+    def __call__(self, states):
+        """Takes an array of shape (n_of_states, dimension) and returns
+        the derivatives at each state, in an array of the same shape."""
+
+        states = np.asarray(states, dtype=float)
+        with profile_stage('vector_field', n_of_items=len(states)):
+            if len(states) == 1:
+                # Single states (e.g. of real-time systems) are way faster to evaluate on floats
+                return np.array([self._evaluate_at_floats(states[0].tolist())])
+            if self.is_vectorized:
+                try:
+                    return self._evaluate_vectorized(states)
+                except (TypeError, ValueError):
+                    self.is_vectorized = False
+            return self._evaluate_pointwise(states)
+
+    def evaluate_at_point(self, point):
+        """Applies the field to a single point (of the system's dimension)."""
+
+        with profile_stage('vector_field', n_of_items=1):
+            return np.array(self._evaluate_at_floats([float(c) for c in point[:self.dimension]]))
+
+    def get_definition(self):
+        """Returns what defines the field, to tell fields apart (e.g. in a TrajectoryCache)."""
+
+        return dict(functions=self.functions)
+
+    def scaled(self, scale_factor):
+        """Returns the field of the system scaled by scale_factor, that is,
+        scale_factor * f(v / scale_factor). Larger scale_factor results in larger system."""
+
+        return SystemVectorField([
+            (lambda f: lambda *v: scale_factor * f(*[c / scale_factor for c in v]))(f)
+            for f in self.functions
+        ])
+
+    def _evaluate_vectorized(self, states):
+        n_of_states = len(states)
+        derivatives = np.empty((n_of_states, self.dimension))
+        columns = states.T
+        for axis, function in enumerate(self.functions):
+            # Constant components (e.g. lambda x,y: 1) return a scalar, which fills the column
+            derivatives[:, axis] = function(*columns)
+        return derivatives
+
+    def _evaluate_at_floats(self, state):
+        return [function(*state) for function in self.functions]
+
+    def _evaluate_pointwise(self, states):
+        derivatives = np.empty((len(states), self.dimension))
+        for i, state in enumerate(states.tolist()):
+            for axis, function in enumerate(self.functions):
+                derivatives[i, axis] = function(*state)
+        return derivatives
+
+
+
+class TimeDirectedVectorField:
+    """Field of a batch of states where each one moves forward (direction 1) or backward
+    (direction -1) in time, that is, the field at each state times its direction. This way
+    states going both ways are integrated together, with a positive dt, and every stage
+    of the solver evaluates the field once for all of them.
+
+    It's always evaluated on the whole batch, with the states in the same order as the directions."""
+
+    def __init__(self, vector_field: SystemVectorField, directions):
+        self.vector_field = vector_field
+        self.functions = vector_field.functions
+        self.dimension = vector_field.dimension
+        self.directions = np.asarray(directions, dtype=float).reshape(-1, 1)
+
+    def __call__(self, states):
+        return self.vector_field(states) * self.directions
+
+    def get_definition(self):
+        return dict(vector_field=self.vector_field.get_definition(), directions=self.directions)
+